@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the personal data redaction path
+
+Usage:
+    ./benchmark.py <name> [size ...]
+    ./benchmark.py suite [size ...] [--json OUT] [--compare BASELINE]
+
+The suite times filter_datum, RedactingFormatter.format and the export
+loop over synthetic data of varying message length, field count,
+separator and PII density. It reports ops/s, ns/record and peak memory,
+and can save the results as JSON and compare them with a previous run.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import re
+import sqlite3
+import time
+import tracemalloc
+from typing import Callable, List
+from filtered_logger import (
+    PII_FIELDS, RedactingFormatter, export_users, export_users_parallel,
+    filter_datum, format_row, pii_indexes, redact_row, redact_tokens
+)
+
+
+def filter_datum_uncached(
+    fields: List[str], redaction: str, message: str, separator: str
+) -> str:
+    """ filter_datum before the compiled pattern cache
+    """
+    pattern = f'({"|".join(fields)})=.*?{separator}'
+    return re.sub(
+        pattern,
+        lambda m: m.group(0).split('=')[0] + f'={redaction}{separator}',
+        message
+    )
+
+
+def synthetic_fields(count: int) -> List[str]:
+    """ count PII field names
+    """
+    return ["pii{}".format(i) for i in range(count)]
+
+
+def synthetic_lines(size: int, fields: List[str], separator: str = ";",
+                    pii_every: int = 2, value_length: int = 0) -> List[str]:
+    """ size log lines where every pii_every-th column is a PII field,
+    values padded by value_length characters
+    """
+    columns = []
+    for i in range(len(fields) * pii_every):
+        if i % pii_every == 0:
+            columns.append(fields[i // pii_every])
+        else:
+            columns.append("col{}".format(i))
+    padding = "x" * value_length
+    template = separator.join(
+        "{}=value{}{}_{{0}}".format(col, i, padding)
+        for i, col in enumerate(columns)
+    ) + separator
+    return [template.format(i) for i in range(size)]
+
+
+def synthetic_rows(size: int, extra_columns: int = 6) -> List[str]:
+    """ size messages formatted like main() does for a users row
+    """
+    columns = list(PII_FIELDS) + ["col{}".format(i)
+                                  for i in range(extra_columns)]
+    columns.insert(2, "ip")
+    template = "; ".join("{}={{0}}_{}".format(col, col) for col in columns)
+    return [template.format(i) + ";" * (i % 2) for i in range(size)]
+
+
+def bench_filter(sizes: List[int]):
+    """ filter_datum lines/s, uncached vs cached, for 5 and 50 PII fields
+    """
+    print("{:>10} {:>8} {:>16} {:>16}".format(
+        "lines", "fields", "uncached (l/s)", "cached (l/s)"))
+    for size in sizes:
+        for count in (5, 50):
+            fields = synthetic_fields(count)
+            lines = synthetic_lines(size, fields)
+            results = []
+            for redact in (filter_datum_uncached, filter_datum):
+                start = time.perf_counter()
+                for line in lines:
+                    redact(fields, "***", line, ";")
+                results.append(size / (time.perf_counter() - start))
+            print("{:>10} {:>8} {:>16.0f} {:>16.0f}".format(
+                size, count, *results))
+
+
+def bench_tokenizer(sizes: List[int]):
+    """ regex vs single-pass tokenizer engines on long records, for
+    main()-like rows and for 50 PII fields
+    """
+    print("{:>10} {:>8} {:>8} {:>14} {:>16}".format(
+        "records", "columns", "pii", "regex (r/s)", "tokenizer (r/s)"))
+    for size in sizes:
+        cases = [(list(PII_FIELDS), synthetic_rows(size, extra))
+                 for extra in (6, 20, 60)]
+        fields = synthetic_fields(50)
+        cases.append((fields, synthetic_lines(size, fields)))
+        for fields, rows in cases:
+            field_set = frozenset(fields)
+            for row in rows[:1000]:
+                assert redact_tokens(field_set, "***", row, ";") == \
+                    filter_datum(fields, "***", row, ";"), row
+            results = []
+            for redact, arg in ((filter_datum, fields),
+                                (redact_tokens, field_set)):
+                start = time.perf_counter()
+                for row in rows:
+                    redact(arg, "***", row, ";")
+                results.append(size / (time.perf_counter() - start))
+            print("{:>10} {:>8} {:>8} {:>14.0f} {:>16.0f}".format(
+                size, rows[0].count("="), len(fields), *results))
+
+
+def bench_structured(sizes: List[int]):
+    """ Format-then-regex vs redact-by-column-then-format of users rows
+    """
+    columns = ("name", "email", "phone", "ssn", "password", "ip",
+               "last_login", "user_agent")
+    fields = tuple(PII_FIELDS)
+    print("{:>10} {:>14} {:>18}".format(
+        "rows", "string (r/s)", "structured (r/s)"))
+    for size in sizes:
+        rows = [("name{}".format(i), "user{}@example.com".format(i),
+                 "555-{:04d}".format(i % 10000), "123-45-6789", "hash",
+                 "10.0.0.{}".format(i % 256), "2019-11-14 06:16:24",
+                 "Mozilla/5.0") for i in range(size)]
+        start = time.perf_counter()
+        for row in rows:
+            filter_datum(fields, "***", format_row(columns, row), ";")
+        string = size / (time.perf_counter() - start)
+        start = time.perf_counter()
+        for row in rows:
+            indexes = pii_indexes(columns, fields)
+            format_row(columns, redact_row(row, indexes, "***"))
+        structured = size / (time.perf_counter() - start)
+        print("{:>10} {:>14.0f} {:>18.0f}".format(size, string, structured))
+
+
+def synthetic_users_db(size: int) -> sqlite3.Connection:
+    """ In-memory SQLite stand-in holding size users rows
+    """
+    db = sqlite3.connect(":memory:")
+    db.execute("CREATE TABLE users (name TEXT, email TEXT, phone TEXT, "
+               "ssn TEXT, password TEXT, ip TEXT, last_login TEXT, "
+               "user_agent TEXT)")
+    db.executemany("INSERT INTO users VALUES (?, ?, ?, ?, ?, ?, ?, ?)", (
+        ("name{}".format(i), "user{}@example.com".format(i),
+         "555-{:04d}".format(i % 10000), "123-45-6789", "hash",
+         "10.0.0.{}".format(i % 256), "2019-11-14 06:16:24", "Mozilla/5.0")
+        for i in range(size)))
+    return db
+
+
+def null_logger() -> logging.Logger:
+    """ A redacting logger writing to /dev/null
+    """
+    logger = logging.getLogger("benchmark")
+    logger.handlers = []
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    handler = logging.StreamHandler(open(os.devnull, "w"))
+    handler.setFormatter(RedactingFormatter(fields=PII_FIELDS))
+    logger.addHandler(handler)
+    return logger
+
+
+def bench_parallel(sizes: List[int]):
+    """ export_users rows/s, serial then on 1 to cpu_count() processes
+    """
+    logger = null_logger()
+    cores = os.cpu_count() or 1
+    print("{:>10} {:>10} {:>12} {:>10}".format(
+        "rows", "workers", "rows/s", "speedup"))
+    for size in sizes:
+        db = synthetic_users_db(size)
+        start = time.perf_counter()
+        export_users(db, logger, 5000, structured=False)
+        serial = size / (time.perf_counter() - start)
+        print("{:>10} {:>10} {:>12.0f} {:>10.2f}".format(
+            size, "serial", serial, 1))
+        workers = 1
+        while workers <= cores:
+            start = time.perf_counter()
+            export_users_parallel(db, logger, workers, 5000, structured=False)
+            rate = size / (time.perf_counter() - start)
+            print("{:>10} {:>10} {:>12.0f} {:>10.2f}".format(
+                size, workers, rate, rate / serial))
+            workers = workers * 2 if workers * 2 <= cores or \
+                workers == cores else cores
+        db.close()
+
+
+def measure(run: Callable[[], int]) -> dict:
+    """ Time run() (which returns its number of records), then run it
+    again under tracemalloc for its peak memory
+    """
+    start = time.perf_counter()
+    records = run()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        "records": records,
+        "ops_per_sec": records / elapsed,
+        "ns_per_record": elapsed / records * 1e9,
+        "peak_kib": peak / 1024,
+    }
+
+
+def suite_cases(size: int):
+    """ (name, params, run) of every suite case for size records
+    """
+    for count in (5, 50):
+        for separator in (";", ","):
+            for pii_every in (1, 4):
+                for value_length in (0, 64):
+                    fields = synthetic_fields(count)
+                    lines = synthetic_lines(size, fields, separator,
+                                            pii_every, value_length)
+                    params = {"fields": count, "separator": separator,
+                              "pii_density": 1 / pii_every,
+                              "value_length": value_length}
+
+                    def run(fields=fields, lines=lines, sep=separator):
+                        for line in lines:
+                            filter_datum(fields, "***", line, sep)
+                        return len(lines)
+                    yield "filter_datum", params, run
+
+    for engine in ("regex", "tokenizer"):
+        for extra in (6, 60):
+            formatter = RedactingFormatter(fields=PII_FIELDS, engine=engine)
+            rows = synthetic_rows(size, extra)
+            params = {"engine": engine, "columns": len(PII_FIELDS) + extra + 1}
+
+            def run(formatter=formatter, rows=rows):
+                for row in rows:
+                    formatter.format(logging.LogRecord(
+                        "user_data", logging.INFO, None, None, row, None,
+                        None))
+                return len(rows)
+            yield "RedactingFormatter.format", params, run
+
+    db = synthetic_users_db(size)
+    logger = null_logger()
+    for structured in (False, True):
+        params = {"structured": structured, "batch_size": 1000}
+
+        def run(structured=structured):
+            return export_users(db, logger, 1000, structured)
+        yield "export_users", params, run
+
+
+def bench_suite(sizes: List[int], json_path: str = None,
+                compare_path: str = None):
+    """ Full redaction suite, optionally saved to / compared with JSON
+    """
+    baseline = {}
+    if compare_path:
+        with open(compare_path) as f:
+            for result in json.load(f)["results"]:
+                baseline[result["key"]] = result
+    results = []
+    print("{:<26} {:<58} {:>12} {:>10} {:>10} {:>8}".format(
+        "benchmark", "params", "ops/s", "ns/rec", "peak KiB", "delta"))
+    for size in sizes:
+        for name, params, run in suite_cases(size):
+            result = measure(run)
+            result["name"] = name
+            result["params"] = params
+            result["key"] = "{} {} {}".format(
+                name, json.dumps(params, sort_keys=True), size)
+            results.append(result)
+            delta = ""
+            if result["key"] in baseline:
+                delta = "{:+.1f}%".format(
+                    (result["ops_per_sec"] /
+                     baseline[result["key"]]["ops_per_sec"] - 1) * 100)
+            print("{:<26} {:<58} {:>12.0f} {:>10.0f} {:>10.0f} {:>8}".format(
+                name, json.dumps(params), result["ops_per_sec"],
+                result["ns_per_record"], result["peak_kib"], delta))
+    if json_path:
+        with open(json_path, "w") as f:
+            json.dump({
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "results": results,
+            }, f, indent=2)
+
+
+BENCHMARKS = {
+    'filter': (bench_filter, [1000000]),
+    'tokenizer': (bench_tokenizer, [100000]),
+    'structured': (bench_structured, [1000000]),
+    'parallel': (bench_parallel, [1000000]),
+    'suite': (bench_suite, [10000]),
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Redaction benchmarks")
+    parser.add_argument("name", choices=list(BENCHMARKS))
+    parser.add_argument("sizes", nargs="*", type=int)
+    parser.add_argument("--json", help="suite: save the results to JSON")
+    parser.add_argument("--compare", help="suite: baseline JSON results")
+    args = parser.parse_args()
+    bench, default_sizes = BENCHMARKS[args.name]
+    sizes = args.sizes or default_sizes
+    if args.name == "suite":
+        bench(sizes, args.json, args.compare)
+    else:
+        bench(sizes)
@@ -2,7 +2,8 @@
 """
 encrypt_password module
 """
-import bcrypt
+from typing import Callable
+from hashing import get_hashing_service
 
 
 def hash_password(password: str) -> bytes:
@@ -10,29 +11,70 @@ def hash_password(password: str) -> bytes:
     Hashes a password with a salt using bcrypt and returns the salted,
     hashed password.
 
+    The hashing runs on the shared bcrypt thread pool (see hashing.py).
+
     Args:
         password (str): The password to hash.
 
     Returns:
         bytes: The salted, hashed password as a byte string.
     """
-    # Generate a salt
-    salt = bcrypt.gensalt()
-
-    # Return the hashed password with the salt
-    return bcrypt.hashpw(password.encode('utf-8'), salt)
+    return get_hashing_service().hash_password(password)
 
 
-def is_valid(hashed_password: bytes, password: str) -> bool:
+def is_valid(hashed_password: bytes, password: str,
+             on_rehash: Callable[[bytes], None] = None) -> bool:
     """
     Validates that the provided password matches the hashed password.
 
     Args:
         hashed_password (bytes): The hashed password.
         password (str): The plain text password to verify.
+        on_rehash (callable): Called with a new hash at the configured
+            bcrypt cost when the password matches a hash of a lower cost,
+            so that the caller can store it.
+
+    Returns:
+        bool: True if the password matches, False otherwise.
+    """
+    hashing = get_hashing_service()
+    if not hashing.check_password(password, hashed_password):
+        return False
+    if on_rehash is not None and hashing.needs_rehash(hashed_password):
+        on_rehash(hashing.hash_password(password))
+    return True
+
+
+async def hash_password_async(password: str) -> bytes:
+    """
+    Awaitable hash_password: the event loop keeps running while bcrypt
+    hashes on the thread pool.
+
+    Args:
+        password (str): The password to hash.
+
+    Returns:
+        bytes: The salted, hashed password as a byte string.
+    """
+    return await get_hashing_service().hash_password_async(password)
+
+
+async def is_valid_async(hashed_password: bytes, password: str,
+                         on_rehash: Callable[[bytes], None] = None) -> bool:
+    """
+    Awaitable is_valid.
+
+    Args:
+        hashed_password (bytes): The hashed password.
+        password (str): The plain text password to verify.
+        on_rehash (callable): See is_valid.
 
     Returns:
         bool: True if the password matches, False otherwise.
     """
-    # Check if the provided password matches the hashed password
-    return bcrypt.checkpw(password.encode('utf-8'), hashed_password)
+    hashing = get_hashing_service()
+    if not await hashing.check_password_async(password, hashed_password):
+        return False
+    if on_rehash is not None and hashing.needs_rehash(hashed_password):
+        on_rehash(await hashing.hash_password_async(password))
+    return True
@@ -3,13 +3,24 @@
 filtered_logger module
 """
 import re
+import atexit
 import logging
-from typing import List
+import logging.handlers
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Callable, FrozenSet, Iterable, List, Pattern, Tuple
 import os
+import sqlite3
 import mysql.connector
 
 # PII_FIELDS constant
 PII_FIELDS = ("name", "email", "phone", "ssn", "password")
+# Keys remembered per set of fields by redact_tokens
+KEY_MEMO_SIZE = 4096
 
 
 def filter_datum(
@@ -28,12 +39,271 @@ def filter_datum(
     Returns:
         The obfuscated log message.
     """
-    pattern = f'({"|".join(fields)})=.*?{separator}'
-    return re.sub(
-        pattern,
-        lambda m: m.group(0).split('=')[0] + f'={redaction}{separator}',
-        message
-    )
+    pattern, replacement = _redaction(tuple(fields), redaction, separator)
+    return pattern.sub(replacement, message)
+
+
+@lru_cache(maxsize=128)
+def _redaction(
+    fields: Tuple[str, ...], redaction: str, separator: str
+) -> Tuple[Pattern, Callable]:
+    """
+    Compiles the pattern and replacement used by filter_datum, once per
+    (fields, redaction, separator).
+
+    Returns:
+        The compiled pattern and its replacement. When the fields and the
+        separator hold no regex syntax the matched name is reused as is,
+        otherwise the match is split on '=' as before.
+    """
+    pattern = re.compile(f'({"|".join(fields)})=.*?{separator}')
+    suffix = f'={redaction}{separator}'
+    if all(re.escape(part) == part and '=' not in part
+           for part in fields + (separator,)):
+        return pattern, lambda m: m.group(1) + suffix
+    return pattern, lambda m: m.group(0).split('=')[0] + suffix
+
+
+def redact_tokens(
+    fields: Iterable[str], redaction: str, message: str, separator: str
+) -> str:
+    """
+    Obfuscates specified fields in a log message in a single pass.
+
+    The message is split on the separator and, in each token, the value
+    after the first `key=` whose key ends with a field is replaced, as
+    filter_datum's pattern does: `xemail=` is a match for `email`, so is
+    `email=` further in a value. As with filter_datum, the text after the
+    last separator is left as is. The result is the same as
+    filter_datum's for single-line messages.
+
+    Args:
+        fields: The fields to obfuscate, ideally already a frozenset.
+        redaction: A string representing by what the field will be obfuscated.
+        message: A string representing the log line.
+        separator: A string representing by which character is separating all
+                   fields in the log line.
+
+    Returns:
+        The obfuscated log message.
+    """
+    if not isinstance(fields, frozenset):
+        fields = frozenset(fields)
+    matches = _key_matches(fields)
+    tokens = message.split(separator)
+    for i in range(len(tokens) - 1):
+        key, eq, value = tokens[i].partition('=')
+        if not eq:
+            continue
+        found = matches.get(key)
+        if found is None:
+            found = _ends_with_field(matches, fields, key)
+        if found:
+            tokens[i] = f'{key}={redaction}'
+        elif '=' in value:
+            # A later `key=` in the value, e.g. `note=email=...`
+            end = len(key) + 1 + value.find('=')
+            while end != -1:
+                if _ends_with_field(matches, fields, tokens[i][:end]):
+                    tokens[i] = tokens[i][:end + 1] + redaction
+                    break
+                end = tokens[i].find('=', end + 1)
+    return separator.join(tokens)
+
+
+def _ends_with_field(matches: dict, fields: FrozenSet[str], key: str) -> bool:
+    """ Whether key ends with one of fields, remembered in matches """
+    found = matches.get(key)
+    if found is None:
+        found = any(key.endswith(field) for field in fields)
+        if len(matches) < KEY_MEMO_SIZE:
+            matches[key] = found
+    return found
+
+
+@lru_cache(maxsize=128)
+def _key_matches(fields: FrozenSet[str]) -> dict:
+    """
+    Memo of redact_tokens for fields: whether a key ends with a field.
+    Log lines repeat their keys, so a key is checked once. It holds up to
+    KEY_MEMO_SIZE keys.
+    """
+    return {}
+
+
+class PoolExhausted(Exception):
+    """ Raised when no pooled connection frees up in time """
+
+
+class ConnectionPool:
+    """ Pool of database connections opened with get_db()
+
+    Connections are reused in LIFO order and checked with a `SELECT 1`
+    on checkout; a broken one is closed and replaced. At most `size` are
+    checked out at once, a further checkout waits up to `timeout` seconds
+    then raises PoolExhausted. Releasing a connection which is not checked
+    out (e.g. twice) raises ValueError.
+    """
+
+    def __init__(self, size: int = None, timeout: float = None,
+                 connect: Callable = None):
+        """ Initialize ConnectionPool
+
+        Args:
+            size: Max connections, default PERSONAL_DATA_DB_POOL_SIZE or 5.
+            timeout: Checkout wait in seconds, default
+                     PERSONAL_DATA_DB_POOL_TIMEOUT or 30.
+            connect: The connection factory, get_db by default.
+        """
+        if size is None:
+            size = int(os.getenv("PERSONAL_DATA_DB_POOL_SIZE", "5"))
+        if timeout is None:
+            timeout = float(os.getenv("PERSONAL_DATA_DB_POOL_TIMEOUT", "30"))
+        self.size = size
+        self.timeout = timeout
+        self._connect = connect or get_db
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        # id() of the connections checked out
+        self._checked_out = set()
+        self.created = 0
+        self.reused = 0
+        self.discarded = 0
+        self.in_use = 0
+
+    def acquire(self):
+        """ Checks a healthy connection out of the pool """
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolExhausted(
+                f"no connection available after {self.timeout}s"
+            )
+        try:
+            while True:
+                try:
+                    db = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+                if self._is_healthy(db):
+                    self._check_out(db, reused=1)
+                    return db
+                self._close(db)
+                self._count(discarded=1)
+            db = self._connect()
+            self._check_out(db, created=1)
+            return db
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, db) -> None:
+        """ Returns a connection to the pool """
+        with self._lock:
+            if id(db) not in self._checked_out:
+                raise ValueError("connection is not checked out of the pool")
+            self._checked_out.remove(id(db))
+            self.in_use -= 1
+        try:
+            db.rollback()
+        except Exception:
+            pass
+        self._idle.put(db)
+        self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """ Context manager checking a connection out and back in """
+        db = self.acquire()
+        try:
+            yield db
+        finally:
+            self.release(db)
+
+    def close(self) -> None:
+        """ Closes the idle connections """
+        while True:
+            try:
+                self._close(self._idle.get_nowait())
+            except queue.Empty:
+                return
+
+    def stats(self) -> dict:
+        """ Returns the connection counters of the pool """
+        with self._lock:
+            return {
+                "size": self.size,
+                "created": self.created,
+                "reused": self.reused,
+                "discarded": self.discarded,
+                "in_use": self.in_use,
+                "idle": self._idle.qsize(),
+            }
+
+    def _check_out(self, db, **deltas) -> None:
+        """ Marks a connection checked out and updates the counters """
+        with self._lock:
+            self._checked_out.add(id(db))
+            self.in_use += 1
+            for name, delta in deltas.items():
+                setattr(self, name, getattr(self, name) + delta)
+
+    def _count(self, **deltas) -> None:
+        """ Updates the counters """
+        with self._lock:
+            for name, delta in deltas.items():
+                setattr(self, name, getattr(self, name) + delta)
+
+    @staticmethod
+    def _is_healthy(db) -> bool:
+        """ Checks that a connection still answers """
+        try:
+            cursor = db.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+            cursor.close()
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close(db) -> None:
+        """ Closes a connection, ignoring errors """
+        try:
+            db.close()
+        except Exception:
+            pass
+
+
+def format_row(columns: List[str], row: tuple) -> str:
+    """
+    Formats a users row as the `col=val; ` message logged by main().
+    """
+    return "; ".join([f"{col}={val}" for col, val in zip(columns, row)])
+
+
+@lru_cache(maxsize=128)
+def pii_indexes(
+    columns: Tuple[str, ...], fields: Tuple[str, ...]
+) -> FrozenSet[int]:
+    """
+    Resolves once which column indexes hold one of the fields.
+    """
+    return frozenset(i for i, col in enumerate(columns) if col in fields)
+
+
+def redact_row(row: tuple, indexes: FrozenSet[int], redaction: str) -> tuple:
+    """
+    Replaces the values at the given column indexes by the redaction.
+    """
+    return tuple(redaction if i in indexes else val
+                 for i, val in enumerate(row))
+
+
+# Redaction engines RedactingFormatter can use
+REDACTION_ENGINES = {
+    "regex": filter_datum,
+    "tokenizer": redact_tokens,
+}
 
 
 class RedactingFormatter(logging.Formatter):
@@ -43,23 +313,127 @@ class RedactingFormatter(logging.Formatter):
     FORMAT = "[HOLBERTON] %(name)s %(levelname)s %(asctime)-15s: %(message)s"
     SEPARATOR = ";"
 
-    def __init__(self, fields: List[str]):
-        """ Initialize RedactingFormatter """
+    def __init__(self, fields: List[str], engine: str = "regex"):
+        """ Initialize RedactingFormatter
+
+        Args:
+            fields: The fields to obfuscate.
+            engine: The redaction engine, a key of REDACTION_ENGINES.
+        """
         super(RedactingFormatter, self).__init__(self.FORMAT)
         self.fields = fields
+        self.redact = REDACTION_ENGINES[engine]
+        self._fields = frozenset(fields) if engine == "tokenizer" \
+            else fields
 
     def format(self, record: logging.LogRecord) -> str:
-        """ Format the log record """
-        record.msg = filter_datum(
-            self.fields, self.REDACTION, record.msg, self.SEPARATOR
+        """ Format the log record
+
+        A record logged with extra={"columns": ..., "row": ...} is redacted
+        by column index before being formatted, without any string scan.
+        One logged with extra={"redacted": True} is left as is.
+        """
+        if getattr(record, "redacted", False):
+            # Already redacted, e.g. by export_users_parallel workers
+            return super().format(record)
+        row = getattr(record, "row", None)
+        if row is not None:
+            columns = tuple(record.columns)
+            indexes = pii_indexes(columns, tuple(self.fields))
+            record.msg = format_row(
+                columns, redact_row(row, indexes, self.REDACTION)
+            )
+            record.args = None
+            return super().format(record)
+        record.msg = self.redact(
+            self._fields, self.REDACTION, record.msg, self.SEPARATOR
         )
         return super().format(record)
 
 
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """ QueueHandler over a bounded queue
+
+    Callers only pay for an enqueue: records are redacted and written by
+    the QueueListener thread. When the queue is full the caller either
+    waits ("block") or the record is dropped and counted ("drop").
+    """
+
+    POLICIES = ("block", "drop")
+
+    def __init__(self, maxsize: int, policy: str = "block"):
+        """ Initialize BoundedQueueHandler """
+        if policy not in self.POLICIES:
+            raise ValueError(f"policy must be one of {self.POLICIES}")
+        super(BoundedQueueHandler, self).__init__(queue.Queue(maxsize))
+        self.policy = policy
+        self.dropped = 0
+        self.max_depth = 0
+        self.listener = None
+        self._lock = threading.Lock()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """ Enqueue the record as is: the listener formats it """
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        """ Put the record on the queue, blocking or dropping when full """
+        if self.policy == "block":
+            self.queue.put(record)
+        else:
+            try:
+                self.queue.put_nowait(record)
+            except queue.Full:
+                with self._lock:
+                    self.dropped += 1
+                return
+        depth = self.queue.qsize()
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+    def stats(self) -> dict:
+        """ Returns the queue depth, its high-water mark and drop count """
+        return {
+            "depth": self.queue.qsize(),
+            "max_depth": self.max_depth,
+            "dropped": self.dropped,
+        }
+
+
+class DrainingQueueListener(logging.handlers.QueueListener):
+    """ QueueListener which drains a full bounded queue when stopped
+
+    stop() waits for room for its sentinel instead of failing with
+    queue.Full, so every record queued before it is written; stopping
+    again is a no-op (e.g. an explicit stop() then the atexit one).
+    """
+
+    def __init__(self, *args, **kwargs):
+        """ Initialize DrainingQueueListener """
+        super(DrainingQueueListener, self).__init__(*args, **kwargs)
+        self._stop_lock = threading.Lock()
+
+    def enqueue_sentinel(self) -> None:
+        """ Put the sentinel behind the queued records, waiting for room
+        """
+        self.queue.put(self._sentinel)
+
+    def stop(self) -> None:
+        """ Writes the queued records then stops the thread, once """
+        with self._stop_lock:
+            if self._thread is not None:
+                super(DrainingQueueListener, self).stop()
+
+
 def get_logger() -> logging.Logger:
     """
     Returns a logger object configured to handle PII data.
 
+    With PERSONAL_DATA_LOG_QUEUE_SIZE > 0, records go through a bounded
+    queue to a listener thread which redacts and writes them;
+    PERSONAL_DATA_LOG_QUEUE_POLICY ("block" or "drop") decides what
+    happens when the queue is full.
+
     Returns:
         A logging.Logger object configured to handle PII data.
     """
@@ -68,9 +442,27 @@ def get_logger() -> logging.Logger:
     logger.propagate = False
 
     stream_handler = logging.StreamHandler()
-    formatter = RedactingFormatter(fields=PII_FIELDS)
+    formatter = RedactingFormatter(
+        fields=PII_FIELDS,
+        engine=os.getenv("PERSONAL_DATA_REDACTION_ENGINE", "regex")
+    )
     stream_handler.setFormatter(formatter)
-    logger.addHandler(stream_handler)
+
+    queue_size = int(os.getenv("PERSONAL_DATA_LOG_QUEUE_SIZE", "0"))
+    if queue_size <= 0:
+        logger.addHandler(stream_handler)
+        return logger
+
+    queue_handler = BoundedQueueHandler(
+        queue_size, os.getenv("PERSONAL_DATA_LOG_QUEUE_POLICY", "block")
+    )
+    queue_handler.listener = DrainingQueueListener(
+        queue_handler.queue, stream_handler, respect_handler_level=True
+    )
+    queue_handler.listener.start()
+    # Drain the queue before the interpreter exits
+    atexit.register(queue_handler.listener.stop)
+    logger.addHandler(queue_handler)
 
     return logger
 
@@ -80,6 +472,9 @@ def get_db() -> mysql.connector.connection.MySQLConnection:
     Connects to a secure MySQL database using credentials from
     environment variables.
 
+    With PERSONAL_DATA_DB_DRIVER=sqlite, PERSONAL_DATA_DB_NAME is opened
+    as a local SQLite database instead, behind the same DB-API interface.
+
     Returns:
         A MySQLConnection object to the database.
     """
@@ -89,6 +484,10 @@ def get_db() -> mysql.connector.connection.MySQLConnection:
     host = os.getenv("PERSONAL_DATA_DB_HOST", "localhost")
     database = os.getenv("PERSONAL_DATA_DB_NAME")
 
+    if os.getenv("PERSONAL_DATA_DB_DRIVER", "mysql") == "sqlite":
+        return sqlite3.connect(database or ":memory:",
+                               check_same_thread=False)
+
     # Connect to the MySQL database
     return mysql.connector.connection.MySQLConnection(
         user=username,
@@ -98,30 +497,134 @@ def get_db() -> mysql.connector.connection.MySQLConnection:
     )
 
 
+def export_users(db, logger: logging.Logger, batch_size: int = 1000,
+                 structured: bool = True) -> int:
+    """
+    Streams the users table to logger, batch_size rows at a time.
+
+    Rows are pulled with fetchmany() from an unbuffered cursor, so memory
+    stays flat whatever the size of the table.
+
+    Args:
+        db: A DB-API connection, as returned by get_db().
+        logger: The logger receiving one message per row.
+        batch_size: The number of rows fetched and formatted at once.
+        structured: Log each row as columns/values for RedactingFormatter
+                    to redact by column, instead of a preformatted message.
+
+    Returns:
+        The number of rows exported.
+    """
+    cursor = db.cursor()
+    try:
+        cursor.execute("SELECT * FROM users;")
+        columns = [desc[0] for desc in cursor.description]
+        count = 0
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            if structured:
+                for row in rows:
+                    logger.info("", extra={"columns": columns, "row": row})
+            else:
+                for message in [format_row(columns, row) for row in rows]:
+                    logger.info(message)
+            count += len(rows)
+        return count
+    finally:
+        cursor.close()
+
+
+def redact_rows(
+    columns: List[str], rows: List[tuple], structured: bool = True
+) -> List[str]:
+    """
+    Formats and redacts rows exactly as RedactingFormatter does for
+    export_users(), returning one message per row.
+    """
+    if structured:
+        indexes = pii_indexes(tuple(columns), tuple(PII_FIELDS))
+        return [format_row(columns,
+                           redact_row(row, indexes,
+                                      RedactingFormatter.REDACTION))
+                for row in rows]
+    return [filter_datum(PII_FIELDS, RedactingFormatter.REDACTION,
+                         format_row(columns, row),
+                         RedactingFormatter.SEPARATOR)
+            for row in rows]
+
+
+def export_users_parallel(db, logger: logging.Logger, workers: int = None,
+                          batch_size: int = 1000,
+                          structured: bool = True) -> int:
+    """
+    Same output as export_users(), with the formatting and redaction of
+    each batch done on a pool of worker processes.
+
+    Batches are logged in their original order; at most two batches per
+    worker are in flight so memory stays bounded.
+
+    Args:
+        db: A DB-API connection, as returned by get_db().
+        logger: The logger receiving one message per row.
+        workers: The number of processes, os.cpu_count() by default.
+        batch_size: The number of rows sent to a worker at once.
+        structured: Redact by column index rather than with filter_datum.
+
+    Returns:
+        The number of rows exported.
+    """
+    workers = workers or os.cpu_count() or 1
+    cursor = db.cursor()
+    try:
+        cursor.execute("SELECT * FROM users;")
+        columns = [desc[0] for desc in cursor.description]
+        count = 0
+        in_flight = deque()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if rows:
+                    in_flight.append(executor.submit(
+                        redact_rows, columns, rows, structured
+                    ))
+                    count += len(rows)
+                if in_flight and (not rows or len(in_flight) >= 2 * workers):
+                    for message in in_flight.popleft().result():
+                        logger.info(message, extra={"redacted": True})
+                elif not rows:
+                    break
+        return count
+    finally:
+        cursor.close()
+
+
 def main() -> None:
     """
     Retrieves and logs information from the users table in the database.
     Obfuscates PII fields in the output.
+
+    Rows are streamed in batches of PERSONAL_DATA_BATCH_SIZE (default 1000)
+    and redacted by PERSONAL_DATA_EXPORT_WORKERS processes when it is > 1.
     """
     # Initialize logger
     logger = get_logger()
 
     # Obtain a database connection
     db = get_db()
-    cursor = db.cursor()
-
-    # Query to fetch all data from the users table
-    query = "SELECT * FROM users;"
-    cursor.execute(query)
+    batch_size = int(os.getenv("PERSONAL_DATA_BATCH_SIZE", "1000"))
+    workers = int(os.getenv("PERSONAL_DATA_EXPORT_WORKERS", "1"))
 
-    # Get column names from the query result
-    columns = [desc[0] for desc in cursor.description]
+    # Stream the users table through the logger
+    try:
+        if workers > 1:
+            export_users_parallel(db, logger, workers, batch_size)
+        else:
+            export_users(db, logger, batch_size)
+    finally:
+        db.close()
 
-    # Iterate over the result and log each row
-    for row in cursor:
-        message = "; ".join([f"{col}={val}" for col, val in zip(columns, row)])
-        logger.info(message)
 
-    # Close the cursor and connection
-    cursor.close()
-    db.close()
+if __name__ == "__main__":
+    main()
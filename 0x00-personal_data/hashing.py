@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Hashing module: bcrypt off the request thread, at a tunable cost.
+
+Run it to print the time per hash of each bcrypt cost on this host,
+then pin the cost it picks with BCRYPT_ROUNDS:
+    ./hashing.py [target_ms]
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, List, Tuple
+
+import bcrypt
+
+
+# bcrypt's own default cost
+DEFAULT_ROUNDS = 12
+MIN_ROUNDS = 4
+MAX_ROUNDS = 16
+
+
+def measure_cost(rounds: int, samples: int = 3) -> float:
+    """
+    Median milliseconds bcrypt takes to hash at this cost on this host.
+    """
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        bcrypt.hashpw(b"calibration", bcrypt.gensalt(rounds))
+        timings.append((time.perf_counter() - start) * 1000)
+    return sorted(timings)[len(timings) // 2]
+
+
+def calibrate_cost(target_ms: float = 250, min_rounds: int = MIN_ROUNDS,
+                   max_rounds: int = MAX_ROUNDS
+                   ) -> Tuple[int, List[Tuple[int, float]]]:
+    """
+    Pick the highest bcrypt cost hashing within target_ms on this host.
+
+    Each extra round doubles the work, so costs are tried upward until
+    one exceeds the budget. Returns the cost (min_rounds at least) and
+    the (cost, ms) measurements.
+    """
+    chosen = min_rounds
+    timings = []
+    for rounds in range(min_rounds, max_rounds + 1):
+        ms = measure_cost(rounds)
+        timings.append((rounds, ms))
+        if ms > target_ms:
+            break
+        chosen = rounds
+    return chosen, timings
+
+
+def hash_cost(hashed_password: bytes) -> int:
+    """
+    The cost a bcrypt hash ($2b$<cost>$...) was made with, None if the
+    hash is not in that format.
+    """
+    if isinstance(hashed_password, str):
+        hashed_password = hashed_password.encode('utf-8')
+    parts = hashed_password.split(b"$")
+    if len(parts) < 4 or not parts[2].isdigit():
+        return None
+    return int(parts[2])
+
+
+class HashingService:
+    """
+    Runs bcrypt hashing and verification on a bounded thread pool.
+
+    bcrypt releases the GIL, so up to max_workers hashes run in parallel
+    on a multi-core host; further calls queue. Every call has a sync and
+    an awaitable entry point, and stats() reports the queue depth and
+    the wait/run latencies.
+
+    New hashes use `rounds` as cost: BCRYPT_ROUNDS, or bcrypt's default.
+    The cost is calibrated once, with ./hashing.py, not by each process:
+    that would add seconds to its first hash, and processes measuring on
+    either side of the budget would pick different costs.
+    """
+    def __init__(self, max_workers: int = None, rounds: int = None) -> None:
+        """
+        Initialize the pool, HASHING_WORKERS or one worker per core.
+        """
+        if rounds is None:
+            rounds = int(os.getenv("BCRYPT_ROUNDS", "0"))
+        self.rounds = rounds or DEFAULT_ROUNDS
+        if max_workers is None:
+            max_workers = int(os.getenv("HASHING_WORKERS", "0")) or \
+                os.cpu_count() or 1
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers,
+                                            thread_name_prefix="bcrypt")
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._wait_total = 0.0
+        self._run_total = 0.0
+        self._run_max = 0.0
+
+    def submit(self, fn: Callable, *args) -> Future:
+        """
+        Run fn(*args) on the pool, recording its queue and run time.
+        """
+        enqueued_at = time.perf_counter()
+        with self._lock:
+            self._queued += 1
+
+        def task():
+            started_at = time.perf_counter()
+            with self._lock:
+                self._queued -= 1
+                self._running += 1
+                self._wait_total += started_at - enqueued_at
+            try:
+                return fn(*args)
+            finally:
+                run = time.perf_counter() - started_at
+                with self._lock:
+                    self._running -= 1
+                    self._completed += 1
+                    self._run_total += run
+                    self._run_max = max(self._run_max, run)
+
+        return self._executor.submit(task)
+
+    def hash_password(self, password: str) -> bytes:
+        """
+        Hash a password with a new salt.
+        """
+        return self.submit(_hash, password, self.rounds).result()
+
+    def check_password(self, password: str, hashed_password: bytes) -> bool:
+        """
+        Check a password against its hash.
+        """
+        return self.submit(_check, password, hashed_password).result()
+
+    async def hash_password_async(self, password: str) -> bytes:
+        """
+        Awaitable hash_password.
+        """
+        return await asyncio.wrap_future(
+            self.submit(_hash, password, self.rounds))
+
+    async def check_password_async(self, password: str,
+                                   hashed_password: bytes) -> bool:
+        """
+        Awaitable check_password.
+        """
+        return await asyncio.wrap_future(
+            self.submit(_check, password, hashed_password))
+
+    def needs_rehash(self, hashed_password: bytes) -> bool:
+        """
+        Whether a hash was made with a lower cost than the current one
+        (or is not a bcrypt hash). Hashes of a higher cost are kept:
+        lowering BCRYPT_ROUNDS does not rewrite them back and forth.
+        """
+        cost = hash_cost(hashed_password)
+        return cost is None or cost < self.rounds
+
+    def stats(self) -> dict:
+        """
+        Queue depth and latencies (milliseconds) of the pool.
+        """
+        with self._lock:
+            done = self._completed or 1
+            return {
+                "workers": self.max_workers,
+                "queued": self._queued,
+                "running": self._running,
+                "completed": self._completed,
+                "avg_wait_ms": self._wait_total / done * 1000,
+                "avg_run_ms": self._run_total / done * 1000,
+                "max_run_ms": self._run_max * 1000,
+            }
+
+    def shutdown(self) -> None:
+        """
+        Wait for the queued calls and stop the pool.
+        """
+        self._executor.shutdown(wait=True)
+
+
+def _hash(password: str, rounds: int = DEFAULT_ROUNDS) -> bytes:
+    """
+    Hash a password with a new salt.
+    """
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds))
+
+
+def _check(password: str, hashed_password: bytes) -> bool:
+    """
+    Check a password against its hash.
+    """
+    if isinstance(hashed_password, str):
+        hashed_password = hashed_password.encode('utf-8')
+    return bcrypt.checkpw(password.encode('utf-8'), hashed_password)
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_hashing_service() -> HashingService:
+    """
+    Return the process-wide HashingService, created on first use.
+    """
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = HashingService()
+    return _service
+
+
+if __name__ == "__main__":
+    target = float(sys.argv[1]) if len(sys.argv) > 1 else 250
+    cost, timings = calibrate_cost(target)
+    print("{:>6} {:>12}".format("cost", "ms/hash"))
+    for rounds, ms in timings:
+        print("{:>6} {:>12.1f}".format(rounds, ms))
+    print("BCRYPT_ROUNDS={} fits a {:.0f} ms budget".format(cost, target))
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+""" Tests of the filtered_logger module
+"""
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+from filtered_logger import (
+    PII_FIELDS, BoundedQueueHandler, ConnectionPool, DrainingQueueListener,
+    PoolExhausted, filter_datum, redact_tokens
+)
+
+
+class GatedHandler(logging.Handler):
+    """ Handler keeping the messages it emits, each once gate is set
+    """
+
+    def __init__(self):
+        """ Initialize GatedHandler, gate closed """
+        super(GatedHandler, self).__init__()
+        self.gate = threading.Event()
+        self.messages = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """ Wait for the gate then keep the message """
+        self.gate.wait()
+        self.messages.append(record.getMessage())
+
+
+class TestQueuedLogging(unittest.TestCase):
+    """ Queued logging mode of get_logger()
+    """
+
+    def setUp(self):
+        """ A logger writing through a queue of 5 records to a gated
+        handler
+        """
+        self.handler = GatedHandler()
+        self.queue_handler = BoundedQueueHandler(5, "block")
+        self.listener = DrainingQueueListener(self.queue_handler.queue,
+                                              self.handler)
+        self.listener.start()
+        self.logger = logging.getLogger("test_filtered_logger")
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+        self.logger.addHandler(self.queue_handler)
+
+    def tearDown(self):
+        """ Stop the listener and detach the handler """
+        self.handler.gate.set()
+        self.listener.stop()
+        self.logger.removeHandler(self.queue_handler)
+
+    def test_stop_drains_full_queue(self):
+        """ stop() with a full queue writes every queued record
+        """
+        # The listener holds the first record, the queue the next 5
+        for i in range(6):
+            self.logger.info("record %d", i)
+        self.assertTrue(self.queue_handler.queue.full())
+        opener = threading.Timer(0.1, self.handler.gate.set)
+        opener.start()
+        self.listener.stop()
+        opener.join()
+        self.assertEqual(self.handler.messages,
+                         ["record {}".format(i) for i in range(6)])
+
+    def test_stop_twice(self):
+        """ Stopping an already stopped listener is a no-op
+        """
+        self.handler.gate.set()
+        self.logger.info("record")
+        self.listener.stop()
+        self.listener.stop()
+        self.assertEqual(self.handler.messages, ["record"])
+
+
+class TestRedactTokens(unittest.TestCase):
+    """ redact_tokens gives the same result as filter_datum
+    """
+
+    MESSAGES = [
+        "name=bob;email=bob@x.io;phone=555;ssn=123;password=pwd;ip=1;",
+        # Values containing '='
+        "name=a=b;email==;ip=1=2;",
+        "note=email=bob@x.io;ip=1;",
+        # Trailing separator or not, PII field in the last column
+        "ip=1;email=bob@x.io",
+        "ip=1;email=bob@x.io;",
+        # Field name at the end of another key
+        "xemail=bob@x.io;email=bob@x.io;",
+        "username=bob;nameemail=z;",
+        # Empty values, keys and tokens
+        "email=;name=;ip=;",
+        "=1;;email=;;",
+        "",
+        "email",
+        # Separator followed by a space, as main() formats rows
+        "name=bob; email=bob@x.io; ip=1;",
+    ]
+
+    def test_same_as_filter_datum(self):
+        """ Same redacted message for each separator
+        """
+        for separator in (";", ","):
+            for message in self.MESSAGES:
+                message = message.replace(";", separator)
+                with self.subTest(message=message):
+                    self.assertEqual(
+                        redact_tokens(PII_FIELDS, "***", message, separator),
+                        filter_datum(list(PII_FIELDS), "***", message,
+                                     separator))
+
+    def test_expected(self):
+        """ Redacted messages as spelled out
+        """
+        self.assertEqual(
+            redact_tokens(PII_FIELDS, "x", "xemail=1;email=2;ip=3;a", ";"),
+            "xemail=x;email=x;ip=3;a")
+        self.assertEqual(
+            redact_tokens(PII_FIELDS, "x", "note=name=1;email=;", ";"),
+            "note=name=x;email=x;")
+
+
+class FakeConnection:
+    """ Database connection answering the health check of the pool
+    """
+
+    def cursor(self):
+        """ Returns this connection as its own cursor """
+        return self
+
+    def execute(self, query: str) -> None:
+        """ Runs nothing """
+
+    def fetchall(self) -> list:
+        """ Returns one row """
+        return [(1,)]
+
+    def close(self) -> None:
+        """ Closes nothing """
+
+    def rollback(self) -> None:
+        """ Rolls nothing back """
+
+
+class TestConnectionPool(unittest.TestCase):
+    """ Checkouts of ConnectionPool
+    """
+
+    def test_double_release(self):
+        """ A second release raises and leaves the pool consistent
+        """
+        pool = ConnectionPool(2, 0.1, FakeConnection)
+        db = pool.acquire()
+        pool.release(db)
+        self.assertRaises(ValueError, pool.release, db)
+        self.assertEqual(pool.stats()["in_use"], 0)
+        self.assertEqual(pool.stats()["idle"], 1)
+        first, second = pool.acquire(), pool.acquire()
+        self.assertIsNot(first, second)
+
+    def test_foreign_release(self):
+        """ A connection the pool never handed out is refused
+        """
+        pool = ConnectionPool(1, 0.1, FakeConnection)
+        self.assertRaises(ValueError, pool.release, FakeConnection())
+        with pool.connection() as db:
+            self.assertIsInstance(db, FakeConnection)
+        self.assertEqual(pool.stats()["reused"], 0)
+        self.assertEqual(pool.stats()["created"], 1)
+
+
+class TestSQLitePool(unittest.TestCase):
+    """ ConnectionPool of get_db() connections to a SQLite database
+    """
+
+    def setUp(self):
+        """ get_db() opens a SQLite database in a new directory """
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        env = {"PERSONAL_DATA_DB_DRIVER": "sqlite",
+               "PERSONAL_DATA_DB_NAME": os.path.join(tmp.name, "users.db")}
+        patcher = mock.patch.dict(os.environ, env)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def pool(self, size: int, timeout: float) -> ConnectionPool:
+        """ A pool closed at the end of the test """
+        pool = ConnectionPool(size, timeout)
+        self.addCleanup(pool.close)
+        return pool
+
+    def test_exhausted(self):
+        """ A checkout beyond size waits timeout then raises, and works
+        again once a connection is released
+        """
+        pool = self.pool(2, 0.2)
+        first, second = pool.acquire(), pool.acquire()
+        self.assertIsInstance(first, sqlite3.Connection)
+        start = time.monotonic()
+        self.assertRaises(PoolExhausted, pool.acquire)
+        self.assertGreaterEqual(time.monotonic() - start, 0.2)
+        pool.release(second)
+        self.assertIs(pool.acquire(), second)
+        self.assertEqual(pool.stats()["in_use"], 2)
+
+    def test_counters(self):
+        """ Sequential checkouts reuse one connection, concurrent ones
+        open more
+        """
+        pool = self.pool(3, 1)
+        for _ in range(4):
+            with pool.connection() as db:
+                db.execute("SELECT 1")
+        self.assertEqual(pool.stats()["created"], 1)
+        self.assertEqual(pool.stats()["reused"], 3)
+        with pool.connection(), pool.connection():
+            pass
+        stats = pool.stats()
+        self.assertEqual((stats["created"], stats["reused"]), (2, 4))
+        self.assertEqual((stats["in_use"], stats["idle"]), (0, 2))
+
+    def test_closed_replaced(self):
+        """ An idle connection closed behind the pool's back is discarded
+        and replaced by a new one
+        """
+        pool = self.pool(1, 1)
+        with pool.connection() as db:
+            db.execute("CREATE TABLE users (name TEXT)")
+        db.close()
+        with pool.connection() as new:
+            self.assertIsNot(new, db)
+            self.assertEqual(new.execute("SELECT 1").fetchone(), (1,))
+        stats = pool.stats()
+        self.assertEqual((stats["created"], stats["reused"],
+                          stats["discarded"]), (2, 0, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
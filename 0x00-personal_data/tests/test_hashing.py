@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+""" Tests of the hashing module
+"""
+import os
+import unittest
+from unittest import mock
+import hashing
+from hashing import HashingService
+
+
+class TestRounds(unittest.TestCase):
+    """ Cost of new hashes and rehashing of stored ones
+    """
+
+    def setUp(self):
+        """ A service hashing at cost 10 """
+        self.service = HashingService(max_workers=1, rounds=10)
+        self.addCleanup(self.service.shutdown)
+
+    def test_needs_rehash(self):
+        """ Only hashes of a lower cost, or not bcrypt, are rehashed
+        """
+        self.assertTrue(self.service.needs_rehash(b"$2b$08$" + b"x" * 53))
+        self.assertFalse(self.service.needs_rehash(b"$2b$10$" + b"x" * 53))
+        self.assertFalse(self.service.needs_rehash("$2b$12$" + "x" * 53))
+        self.assertTrue(self.service.needs_rehash(b"plain"))
+
+    def test_no_calibration_in_process(self):
+        """ BCRYPT_ROUNDS, not a per-process calibration, sets the cost
+        """
+        with mock.patch.dict(os.environ, {"BCRYPT_TARGET_MS": "50"}), \
+                mock.patch.object(hashing, "calibrate_cost") as calibrate:
+            os.environ.pop("BCRYPT_ROUNDS", None)
+            service = HashingService(max_workers=1)
+            service.shutdown()
+        calibrate.assert_not_called()
+        self.assertEqual(service.rounds, hashing.DEFAULT_ROUNDS)
+        with mock.patch.dict(os.environ, {"BCRYPT_ROUNDS": "11"}):
+            service = HashingService(max_workers=1)
+            service.shutdown()
+        self.assertEqual(service.rounds, 11)
+
+
+if __name__ == "__main__":
+    unittest.main()
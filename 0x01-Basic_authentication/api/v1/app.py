@@ -4,6 +4,7 @@ Route module for the API
 """
 from os import getenv
 from api.v1.views import app_views
+from api.v1.auth.auth import PathMatcher
 from flask import Flask, jsonify, abort, request
 from flask_cors import CORS
 
@@ -23,6 +24,11 @@ else:
     from api.v1.auth.auth import Auth
     auth = Auth()
 
+# Paths that don't require authentication, compiled once
+EXCLUDED_PATHS = PathMatcher([
+    '/api/v1/status/', '/api/v1/unauthorized/', '/api/v1/forbidden/'
+    ])
+
 
 @app.errorhandler(401)
 def unauthorized(error) -> str:
@@ -54,10 +60,7 @@ def before_request():
     if auth is None:
         return
 
-    excluded_paths = [
-        '/api/v1/status/', '/api/v1/unauthorized/', '/api/v1/forbidden/'
-        ]
-    if not auth.require_auth(request.path, excluded_paths):
+    if not auth.require_auth(request.path, EXCLUDED_PATHS):
         return
 
     if auth.authorization_header(request) is None:
@@ -4,7 +4,54 @@ Auth module
 """
 from flask import request
 from typing import List, TypeVar
+from functools import lru_cache
 import fnmatch
+import os
+import re
+
+
+class PathMatcher:
+    """Matches a path against a fixed list of excluded paths
+
+    Literal paths go in a set, wildcard paths are combined into a single
+    regular expression, so a lookup costs one set hit and one regex match
+    whatever the number of excluded paths.
+    """
+
+    def __init__(self, excluded_paths: List[str]):
+        """Compile the excluded paths"""
+        self.literals = set()
+        patterns = []
+        for excluded_path in excluded_paths:
+            # Normalize excluded_path to ensure it ends with a slash
+            if not excluded_path.endswith('/'):
+                excluded_path += '/'
+            # Same case handling as fnmatch.fnmatch
+            excluded_path = os.path.normcase(excluded_path)
+            if any(c in excluded_path for c in '*?['):
+                patterns.append(fnmatch.translate(excluded_path))
+            else:
+                self.literals.add(excluded_path)
+        self.regex = None
+        if patterns:
+            self.regex = re.compile('|'.join(
+                '(?:{})'.format(pattern) for pattern in patterns))
+
+    def match(self, path: str) -> bool:
+        """Check if path (normalized with a trailing slash) is excluded"""
+        if not path.endswith('/'):
+            path += '/'
+        path = os.path.normcase(path)
+        if path in self.literals:
+            return True
+        return self.regex is not None and \
+            self.regex.match(path) is not None
+
+
+@lru_cache(maxsize=32)
+def compile_excluded_paths(excluded_paths: tuple) -> PathMatcher:
+    """Returns the PathMatcher of a tuple of excluded paths, built once"""
+    return PathMatcher(excluded_paths)
 
 
 class Auth:
@@ -18,20 +65,9 @@ class Auth:
         if excluded_paths is None or not excluded_paths:
             return True
 
-        # Normalize path to ensure it ends with a slash
-        if not path.endswith('/'):
-            path += '/'
-
-        for excluded_path in excluded_paths:
-            # Normalize excluded_path to ensure it ends with a slash
-            if not excluded_path.endswith('/'):
-                excluded_path += '/'
-
-            # Use fnmatch to handle wildcard matching
-            if fnmatch.fnmatch(path, excluded_path):
-                return False
-
-        return True
+        matcher = excluded_paths if isinstance(excluded_paths, PathMatcher) \
+            else compile_excluded_paths(tuple(excluded_paths))
+        return not matcher.match(path)
 
     def authorization_header(self, request=None) -> str:
         """Method to get the authorization header from the request"""
@@ -3,13 +3,105 @@
 BasicAuth module
 """
 import base64
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
 from api.v1.auth.auth import Auth
 from models.user import User
 
 
+class CredentialCache:
+    """Bounded LRU cache of verified Authorization headers
+
+    Headers are keyed by an HMAC with a per-process random key, so
+    neither the header nor the password it carries is ever stored.
+    An entry remembers the user ID with the email and password hash it
+    was verified against, and is dropped as soon as they change.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 300):
+        """Initialize an empty cache"""
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._key = os.urandom(32)
+        self._entries = OrderedDict()
+        self._digests_by_user_id = {}
+        self._lock = threading.Lock()
+
+    def digest(self, authorization_header: str) -> bytes:
+        """Keyed digest of an Authorization header"""
+        return hmac.new(self._key, authorization_header.encode('utf-8'),
+                        hashlib.sha256).digest()
+
+    def get(self, digest: bytes):
+        """Returns the User verified for digest, or None"""
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None:
+                user_id, email, pwd_hash, expires_at = entry
+                user = User.get(user_id)
+                if user is not None and expires_at > time.monotonic() and \
+                        user.email == email and user.password == pwd_hash:
+                    self._entries.move_to_end(digest)
+                    self.hits += 1
+                    return user
+                self._drop(digest)
+            self.misses += 1
+            return None
+
+    def put(self, digest: bytes, user: User):
+        """Remember that digest authenticates user"""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._drop(digest)
+            self._entries[digest] = (user.id, user.email, user.password,
+                                     time.monotonic() + self.ttl)
+            self._digests_by_user_id.setdefault(user.id, set()).add(digest)
+            while len(self._entries) > self.max_size:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate(self, user: User):
+        """Forget every header verified for user"""
+        with self._lock:
+            for digest in list(self._digests_by_user_id.get(user.id, ())):
+                self._drop(digest)
+
+    def stats(self) -> dict:
+        """Returns the hit/miss counters and the cache size"""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'size': len(self._entries)}
+
+    def _drop(self, digest: bytes):
+        """Remove one entry (caller holds the lock)"""
+        entry = self._entries.pop(digest, None)
+        if entry is None:
+            return
+        digests = self._digests_by_user_id.get(entry[0])
+        if digests is not None:
+            digests.discard(digest)
+            if not digests:
+                del self._digests_by_user_id[entry[0]]
+
+
 class BasicAuth(Auth):
     """Class to manage basic API authentication"""
 
+    def __init__(self):
+        """Initialize the verified-credential cache"""
+        super().__init__()
+        self.credential_cache = CredentialCache(
+            int(os.getenv('BASIC_AUTH_CACHE_SIZE', '1024')),
+            float(os.getenv('BASIC_AUTH_CACHE_TTL', '300')))
+        # A saved (maybe new password) or removed user must log in again
+        User.add_listener(self.credential_cache.invalidate)
+
     def extract_base64_authorization_header(
             self, authorization_header: str) -> str:
         """Method to extract the Base64 part of the Authorization header"""
@@ -93,6 +185,12 @@ class BasicAuth(Auth):
         if auth_header is None:
             return None
 
+        # Repeat clients skip the decode, search and hash below
+        digest = self.credential_cache.digest(auth_header)
+        user = self.credential_cache.get(digest)
+        if user is not None:
+            return user
+
         base64_auth_header = self.extract_base64_authorization_header(
             auth_header
             )
@@ -112,4 +210,10 @@ class BasicAuth(Auth):
             return None
 
         user = self.user_object_from_credentials(user_email, user_pwd)
+        if user is not None:
+            self.credential_cache.put(digest, user)
         return user
+
+    def cache_stats(self) -> dict:
+        """Returns the verified-credential cache counters"""
+        return self.credential_cache.stats()
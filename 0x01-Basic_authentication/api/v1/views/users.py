@@ -2,18 +2,111 @@
 """ Module of Users views
 """
 from api.v1.views import app_views
-from flask import abort, jsonify, request
+from flask import abort, jsonify, request, Response
 from models.user import User
+import json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# Users fetched per page() call while streaming
+STREAM_PAGE_SIZE = 1000
+
+
+def dumps(obj) -> str:
+    """ JSON string of obj, encoded by orjson when it is installed
+    """
+    if orjson is None:
+        return json.dumps(obj)
+    return orjson.dumps(obj).decode()
+
+
+def json_response(obj) -> Response:
+    """ Response of the JSON of obj, like jsonify() (keys sorted) but
+    encoded by orjson, several times faster on long lists, when it is
+    installed
+    """
+    if orjson is None:
+        return jsonify(obj)
+    return Response(orjson.dumps(obj, option=orjson.OPT_SORT_KEYS),
+                    mimetype="application/json")
+
+
+def stream_users(users: list, cursor: str, limit: int, stream: str):
+    """ Generate the users of a streamed GET /api/v1/users, a page at a
+    time: users is the first page and cursor the cursor of the next one
+    """
+    if stream == "json":
+        yield "["
+    sent = 0
+    while True:
+        for user in users:
+            line = dumps(user.to_json())
+            if stream == "ndjson":
+                yield line + "\n"
+            else:
+                yield line if sent == 0 else "," + line
+            sent += 1
+        if cursor is None or limit is not None and sent >= limit:
+            break
+        size = STREAM_PAGE_SIZE
+        if limit is not None:
+            size = min(size, limit - sent)
+        users, cursor = User.page(size, cursor)
+    if stream == "json":
+        yield "]"
 
 
 @app_views.route('/users', methods=['GET'], strict_slashes=False)
 def view_all_users() -> str:
     """ GET /api/v1/users
+    Query parameters (optional):
+      - limit: maximum number of users returned
+      - cursor: return the users after this one (X-Next-Cursor header
+        of the previous page)
+      - stream: 'ndjson' (one user per line) or 'json' (a JSON list)
+        to stream the users instead of building the whole response
     Return:
-      - list of all User objects JSON represented
+      - list of all User objects JSON represented, ordered by creation
+        date when paginated or streamed
+      - 400 if a parameter is invalid
     """
-    all_users = [user.to_json() for user in User.all()]
-    return jsonify(all_users)
+    limit = request.args.get('limit')
+    cursor = request.args.get('cursor')
+    stream = request.args.get('stream')
+    if limit is None and cursor is None and stream is None:
+        all_users = [user.to_json() for user in User.all()]
+        return json_response(all_users)
+
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            limit = 0
+        if limit < 1:
+            return jsonify({'error': "Invalid limit"}), 400
+    if stream not in (None, "ndjson", "json"):
+        return jsonify({'error': "Invalid stream"}), 400
+    size = limit
+    if stream is not None:
+        size = STREAM_PAGE_SIZE if limit is None \
+            else min(limit, STREAM_PAGE_SIZE)
+    try:
+        users, next_cursor = User.page(size, cursor)
+    except ValueError:
+        return jsonify({'error': "Invalid cursor"}), 400
+
+    if stream is not None:
+        mimetype = "application/x-ndjson" if stream == "ndjson" \
+            else "application/json"
+        return Response(stream_users(users, next_cursor, limit, stream),
+                        mimetype=mimetype)
+    response = json_response([user.to_json() for user in users])
+    if next_cursor is not None:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
 
 
 @app_views.route('/users/<user_id>', methods=['GET'], strict_slashes=False)
@@ -30,7 +123,7 @@ def view_one_user(user_id: str = None) -> str:
     user = User.get(user_id)
     if user is None:
         abort(404)
-    return jsonify(user.to_json())
+    return json_response(user.to_json())
 
 
 @app_views.route('/users/<user_id>', methods=['DELETE'], strict_slashes=False)
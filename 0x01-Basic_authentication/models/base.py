@@ -1,20 +1,195 @@
 #!/usr/bin/env python3
 """ Base module
 """
+from bisect import bisect_left, bisect_right, insort
+from contextlib import contextmanager
 from datetime import datetime
-from typing import TypeVar, List, Iterable
-from os import path
+from typing import TypeVar, List, Iterable, Iterator, Tuple
+from models.query import Query
+from operator import attrgetter
+from os import getenv, getpid, path, replace, stat, unlink
+import atexit
+import base64
 import json
+import logging
+import os
+import threading
+import time
 import uuid
+import weakref
+try:
+    import fcntl
+except ImportError:
+    # No file locks (e.g. Windows): a single process per database
+    fcntl = None
 
 
 TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
 DATA = {}
+INDEXES = {}
+INDEXED_VALUES = {}
+PENDING = {}
+LAST_FLUSH_LAG = {}
+FLUSH_ERRORS = {}
+FILE_SIGNATURES = {}
+JOURNAL_OFFSETS = {}
+GENERATIONS = {}
+NEXT_RELOAD_CHECKS = {}
+LISTENERS = {}
+ATTRIBUTES = {}
+SERIALIZERS = {}
+FILE_LOCK_DEPTHS = {}
+ORDERED = {}
+ORDER_KEYS = {}
+SORTED_VALUES = {}
+
+_pending_lock = threading.Lock()
+_listeners_lock = threading.Lock()
+_write_lock = threading.RLock()
+_flusher_wakeup = threading.Event()
+_flusher = None
+# Seconds the flusher waits before retrying after a failed flush
+FLUSH_RETRY_DELAY = 1.0
+_MISSING = object()
+# Sorts after any object ID
+_MAX_ID = chr(0x10ffff)
+# Slots which are not attributes of the model: never serialized
+_TRANSIENT_SLOTS = ('__dict__', '__weakref__', '_formatted')
+
+
+class ReadWriteLock():
+    """ Lock shared by any number of readers or held by one writer
+
+    Waiting writers go first: new readers queue behind them. Both sides
+    are reentrant, and the writer may also read, but a reader must not
+    ask for the write lock.
+    """
+
+    def __init__(self):
+        """ Initialize an unlocked lock
+        """
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = None
+        self._waiting_writers = 0
+        self._local = threading.local()
+
+    @contextmanager
+    def read(self):
+        """ Hold the lock as a reader
+        """
+        me = threading.get_ident()
+        depth = getattr(self._local, 'reads', 0)
+        if depth or self._writer == me:
+            self._local.reads = depth + 1
+            try:
+                yield
+            finally:
+                self._local.reads = depth
+            return
+        with self._cond:
+            while self._writer is not None or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+        self._local.reads = 1
+        try:
+            yield
+        finally:
+            self._local.reads = 0
+            with self._cond:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        """ Hold the lock as the writer
+        """
+        me = threading.get_ident()
+        if self._writer == me:
+            yield
+            return
+        with self._cond:
+            self._waiting_writers += 1
+            while self._writer is not None or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writer = me
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = None
+                self._cond.notify_all()
+
+
+# Guards DATA and the indexes: readers share it, save()/remove()/loads
+# hold it alone. Always taken before _write_lock, never after.
+_data_lock = ReadWriteLock()
+
+
+def _fsync_dir(file_path: str):
+    """ fsync the directory of file_path: its creation, renaming or
+    removal survives an OS crash
+    """
+    fd = os.open(path.dirname(path.abspath(file_path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def parse_timestamp(value: str, memo: dict = None) -> datetime:
+    """ Parse a TIMESTAMP_FORMAT string, much faster than strptime
+
+    memo, when given, maps already parsed strings to their (immutable)
+    datetime so that rows sharing a timestamp share one object.
+    """
+    if memo is not None:
+        parsed = memo.get(value)
+        if parsed is not None:
+            return parsed
+    if len(value) == 19 and value[10] == 'T':
+        parsed = datetime.fromisoformat(value)
+    else:
+        parsed = datetime.strptime(value, TIMESTAMP_FORMAT)
+    if memo is not None:
+        memo[value] = parsed
+    return parsed
 
 
 class Base():
     """ Base class
+
+    Models declare their attributes in __slots__: instances carry no
+    per-object __dict__, which keeps large tables compact in memory.
     """
+    # _formatted caches the formatted timestamps (see _timestamps)
+    __slots__ = ('id', 'created_at', 'updated_at', '_formatted')
+
+    # Attributes with a secondary index: equality searches on them
+    # are a dict lookup instead of a scan of DATA (an SQL index in SQLite)
+    indexed_attributes = ()
+    # Journal mode (JSON storage): save()/remove() append one record to
+    # .db_<Class>.journal instead of rewriting .db_<Class>.json, which is
+    # only rewritten (compacted) once the journal outgrows journal_max_size
+    journal = getenv('BASE_JOURNAL', '0') == '1'
+    journal_max_size = int(getenv('BASE_JOURNAL_MAX_SIZE', str(1 << 20)))
+    # fsync each append: acknowledged records survive an OS crash or a
+    # power loss, not just a crash of the process
+    journal_fsync = getenv('BASE_JOURNAL_FSYNC', '0') == '1'
+    # Deferred mode (JSON storage, flush_interval > 0): mutations only mark
+    # the class dirty and a background thread writes them at most once per
+    # flush_interval seconds, or as soon as flush_max_pending are queued
+    flush_interval = float(getenv('BASE_FLUSH_INTERVAL', '0'))
+    flush_max_pending = int(getenv('BASE_FLUSH_MAX_PENDING', '1000'))
+    # Cross-process changes (JSON storage, reload_interval >= 0): reads
+    # first check whether another process changed the files, at most
+    # once per reload_interval seconds, and reload what it wrote
+    reload_interval = float(getenv('BASE_RELOAD_INTERVAL', '-1'))
+    # Storage backend (see Storage), get_storage() once this module is
+    # loaded; a model may be given a backend of its own
+    storage = None
 
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a Base instance
@@ -24,17 +199,50 @@ class Base():
             DATA[s_class] = {}
 
         self.id = kwargs.get('id', str(uuid.uuid4()))
-        if kwargs.get('created_at') is not None:
-            self.created_at = datetime.strptime(kwargs.get('created_at'),
-                                                TIMESTAMP_FORMAT)
+        created_at = kwargs.get('created_at')
+        updated_at = kwargs.get('updated_at')
+        if created_at is not None:
+            self.created_at = parse_timestamp(created_at)
         else:
             self.created_at = datetime.utcnow()
-        if kwargs.get('updated_at') is not None:
-            self.updated_at = datetime.strptime(kwargs.get('updated_at'),
-                                                TIMESTAMP_FORMAT)
+        # datetimes are immutable: share one object when both are equal
+        if updated_at is None and created_at is None or \
+                updated_at is not None and updated_at == created_at:
+            self.updated_at = self.created_at
+        elif updated_at is not None:
+            self.updated_at = parse_timestamp(updated_at)
         else:
             self.updated_at = datetime.utcnow()
 
+    @classmethod
+    def from_json(cls, obj_json: dict, memo: dict = None) -> TypeVar('Base'):
+        """ Build an object from its serialized form (to_json(True))
+
+        Slotted models are filled in directly, without going through
+        __init__ and its keyword arguments; memo is the timestamp memo
+        of parse_timestamp, shared across a bulk load.
+        """
+        if cls.__dictoffset__ != 0:
+            # Attributes outside __slots__: only __init__ knows them
+            return cls(**obj_json)
+        obj = cls.__new__(cls)
+        get = obj_json.get
+        for name in cls._slot_names()[3:]:
+            setattr(obj, name, get(name))
+        obj.id = get('id') if 'id' in obj_json else str(uuid.uuid4())
+        created_at = obj_json.get('created_at')
+        updated_at = obj_json.get('updated_at')
+        if created_at is None:
+            obj.created_at = datetime.utcnow()
+        else:
+            obj.created_at = parse_timestamp(created_at, memo)
+        if updated_at is None:
+            obj.updated_at = obj.created_at if created_at is None \
+                else datetime.utcnow()
+        else:
+            obj.updated_at = parse_timestamp(updated_at, memo)
+        return obj
+
     def __eq__(self, other: TypeVar('Base')) -> bool:
         """ Equality
         """
@@ -47,66 +255,548 @@ class Base():
     def to_json(self, for_serialization: bool = False) -> dict:
         """ Convert the object a JSON dictionary
         """
+        if not getattr(self, '__dict__', None):
+            serializer = SERIALIZERS.get((self.__class__, for_serialization))
+            if serializer is None:
+                serializer = self._serializer(for_serialization)
+            result = serializer(self)
+            if result is not None:
+                return result
         result = {}
-        for key, value in self.__dict__.items():
+        for key in self._attributes():
             if not for_serialization and key[0] == '_':
                 continue
+            value = getattr(self, key, _MISSING)
+            if value is _MISSING:
+                continue
             if type(value) is datetime:
                 result[key] = value.strftime(TIMESTAMP_FORMAT)
             else:
                 result[key] = value
         return result
 
+    @classmethod
+    def _serializer(cls, for_serialization: bool):
+        """ Serializer of the objects of the class without attributes
+        outside __slots__, compiled once per class: it reads all the
+        attributes at once and takes the timestamps from _timestamps().
+        It returns None when an attribute is unset or a timestamp is not
+        a datetime (to_json() then walks the attributes one by one).
+        """
+        names = tuple(name for name in cls._slot_names()[3:]
+                      if for_serialization or name[0] != '_')
+        get = attrgetter('id', *names)
+
+        def serialize(obj: Base) -> dict:
+            """ JSON dictionary of obj
+            """
+            try:
+                values = get(obj)
+                created_at, updated_at = obj._timestamps()
+            except AttributeError:
+                return None
+            result = {'id': values[0], 'created_at': created_at,
+                      'updated_at': updated_at}
+            result.update(zip(names, values[1:]))
+            if datetime in map(type, values):
+                for key, value in result.items():
+                    if type(value) is datetime:
+                        result[key] = value.strftime(TIMESTAMP_FORMAT)
+            return result
+        SERIALIZERS[(cls, for_serialization)] = serialize
+        return serialize
+
+    def _timestamps(self) -> Tuple[str, str]:
+        """ created_at and updated_at formatted, cached until either
+        changes (save() sets a new updated_at)
+        """
+        created_at = self.created_at
+        updated_at = self.updated_at
+        formatted = getattr(self, '_formatted', None)
+        if formatted is not None and formatted[0] is created_at and \
+                formatted[1] is updated_at:
+            return formatted[2]
+        strings = (created_at.strftime(TIMESTAMP_FORMAT),)
+        if updated_at is created_at:
+            strings += strings
+        else:
+            strings += (updated_at.strftime(TIMESTAMP_FORMAT),)
+        self._formatted = (created_at, updated_at, strings)
+        return strings
+
+    @classmethod
+    def _slot_names(cls) -> tuple:
+        """ Names in the __slots__ of the class hierarchy, Base's first
+        """
+        names = ATTRIBUTES.get(cls)
+        if names is None:
+            names = []
+            for klass in reversed(cls.__mro__):
+                for name in klass.__dict__.get('__slots__', ()):
+                    if name not in _TRANSIENT_SLOTS and \
+                            name not in names:
+                        names.append(name)
+            names = ATTRIBUTES[cls] = tuple(names)
+        return names
+
+    def _attributes(self) -> tuple:
+        """ Names of the attributes of this object: the __slots__ of its
+        classes, base first, then any __dict__ entries
+        """
+        names = self._slot_names()
+        extra = getattr(self, '__dict__', None)
+        if extra:
+            return names + tuple(k for k in extra if k not in names)
+        return names
+
     @classmethod
     def load_from_file(cls):
         """ Load all objects from file
         """
+        cls.storage.load(cls)
+
+    @classmethod
+    def reload_if_changed(cls) -> bool:
+        """ Reload from file only if another writer changed it since the
+        last load, return True when reloaded
+        """
+        return cls.storage.reload_if_changed(cls)
+
+    @classmethod
+    def _file_signature(cls) -> tuple:
+        """ Identity (inode, size, mtime) of the snapshot and journal files
+        """
+        signature = []
+        for ext in ("json", "journal"):
+            try:
+                st = stat(".db_{}.{}".format(cls.__name__, ext))
+                signature.append((st.st_ino, st.st_size, st.st_mtime_ns))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    @classmethod
+    def _track_write(cls, before: tuple):
+        """ Record our own write so reload_if_changed() skips it, unless
+        the files had already been changed by someone else
+        """
         s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        DATA[s_class] = {}
-        if not path.exists(file_path):
-            return
+        if FILE_SIGNATURES.get(s_class) == before:
+            FILE_SIGNATURES[s_class] = cls._file_signature()
 
-        with open(file_path, 'r') as f:
-            objs_json = json.load(f)
-            for obj_id, obj_json in objs_json.items():
-                DATA[s_class][obj_id] = cls(**obj_json)
+    @classmethod
+    @contextmanager
+    def _file_lock(cls):
+        """ Hold the lock of the files of this class across processes
+        (flock of .db_<Class>.lock): appends to the journal, compactions
+        and reads of the files run one at a time. Reentrant.
+        """
+        s_class = cls.__name__
+        with _write_lock:
+            depth = FILE_LOCK_DEPTHS.get(s_class, 0)
+            FILE_LOCK_DEPTHS[s_class] = depth + 1
+            try:
+                if depth or fcntl is None:
+                    yield
+                else:
+                    # Closing the file releases the lock
+                    with open(".db_{}.lock".format(s_class), 'a') as f:
+                        fcntl.flock(f, fcntl.LOCK_EX)
+                        yield
+            finally:
+                FILE_LOCK_DEPTHS[s_class] = depth
 
     @classmethod
     def save_to_file(cls):
         """ Save all objects to file
+
+        In journal mode, this compacts the journal: the records other
+        processes appended to it are applied to DATA first, under the
+        file lock which keeps them from appending more until it is gone.
         """
         s_class = cls.__name__
         file_path = ".db_{}.json".format(s_class)
-        objs_json = {}
-        for obj_id, obj in DATA[s_class].items():
-            objs_json[obj_id] = obj.to_json(True)
+        # Read lock until the file is written: no mutation can slip in
+        # between the snapshot and the write. Catching up with the
+        # journal mutates DATA: the write lock then.
+        data_lock = _data_lock.write if cls.journal else _data_lock.read
+        with data_lock(), _write_lock, cls._file_lock():
+            if cls.journal:
+                cls.storage.catch_up(cls)
+            objs_json = {}
+            for obj_id, obj in DATA[s_class].items():
+                objs_json[obj_id] = obj.to_json(True)
 
-        with open(file_path, 'w') as f:
-            json.dump(objs_json, f)
+            before = cls._file_signature()
+            # Write aside then rename: a crash never truncates the file
+            # and readers only ever open a complete one. The data is on
+            # disk before the rename, and the rename before the journal
+            # is removed: even a power loss leaves one of them whole.
+            tmp_path = "{}.{}.tmp".format(file_path, getpid())
+            with open(tmp_path, 'w') as f:
+                json.dump(objs_json, f)
+                f.flush()
+                os.fsync(f.fileno())
+            replace(tmp_path, file_path)
+            _fsync_dir(file_path)
+
+            # The snapshot now holds every journaled mutation
+            journal_path = ".db_{}.journal".format(s_class)
+            if path.exists(journal_path):
+                unlink(journal_path)
+            JOURNAL_OFFSETS[s_class] = 0
+            cls._track_write(before)
+
+    @classmethod
+    def _append_journal(cls, records: List[str]):
+        """ Append serialized mutation records to the journal, under the
+        write lock of _data_lock (a compaction may follow)
+        """
+        s_class = cls.__name__
+        journal_path = ".db_{}.journal".format(s_class)
+        with _write_lock, cls._file_lock():
+            before = cls._file_signature()
+            data = "".join(records).encode()
+            with open(journal_path, 'ab', buffering=0) as f:
+                start = f.tell()
+                try:
+                    view = memoryview(data)
+                    while view:
+                        view = view[f.write(view):]
+                    if cls.journal_fsync:
+                        os.fsync(f.fileno())
+                except BaseException:
+                    # No torn record in front of the next append
+                    f.truncate(start)
+                    raise
+                size = f.tell()
+            if cls.journal_fsync and start == 0:
+                _fsync_dir(journal_path)
+            cls._track_write(before)
+            # Our own records need no replay, unless another process
+            # appended before them
+            if JOURNAL_OFFSETS.get(s_class, 0) == start:
+                JOURNAL_OFFSETS[s_class] = size
+            if size > cls.journal_max_size:
+                cls.save_to_file()
+
+    @classmethod
+    def _read_journal(cls, offset: int = 0, repair: bool = True):
+        """ Yield (offset after it, record) for each journal record from
+        byte offset on
+
+        repair truncates a torn last record, left by an interrupted
+        append, so that the next appends start on a clean line. Without
+        it, an incomplete last record is skipped: another process may be
+        writing it.
+        """
+        journal_path = ".db_{}.journal".format(cls.__name__)
+        if not path.exists(journal_path):
+            return
+        with open(journal_path, 'r+b' if repair else 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("unterminated record")
+                    record = json.loads(line)
+                except ValueError:
+                    if repair:
+                        f.seek(offset)
+                        f.truncate()
+                    return
+                offset += len(line)
+                yield offset, record
+
+    @classmethod
+    def _persist(cls, obj_id: str, obj: TypeVar('Base') = None):
+        """ Persist the mutation of one object (obj None: removal)
+        """
+        record = None
+        if cls.journal:
+            obj_json = obj.to_json(True) if obj is not None else None
+            record = json.dumps({'id': obj_id, 'obj': obj_json}) + "\n"
+
+        if cls.flush_interval <= 0:
+            if record is None:
+                cls.save_to_file()
+            else:
+                cls._append_journal([record])
+            return
+
+        s_class = cls.__name__
+        with _pending_lock:
+            pending = PENDING.get(s_class)
+            if pending is None:
+                pending = {'cls': cls, 'since': time.monotonic(),
+                           'count': 0, 'records': []}
+                PENDING[s_class] = pending
+                _flusher_wakeup.set()
+            pending['count'] += 1
+            if record is not None:
+                pending['records'].append(record)
+            full = pending['count'] >= cls.flush_max_pending
+        if full:
+            cls.flush()
+        else:
+            _start_flusher()
+
+    @classmethod
+    def flush(cls):
+        """ Write the pending mutations of this class now
+        """
+        cls.storage.flush(cls)
+
+    @classmethod
+    def flush_stats(cls) -> dict:
+        """ Pending mutations, flush lag (seconds) and error of the last
+        flush, if it failed, of this class
+        """
+        s_class = cls.__name__
+        with _pending_lock:
+            pending = PENDING.get(s_class)
+            if pending is None:
+                count, lag = 0, 0.0
+            else:
+                count = pending['count']
+                lag = time.monotonic() - pending['since']
+        return {
+            'pending': count,
+            'lag': lag,
+            'last_flush_lag': LAST_FLUSH_LAG.get(s_class, 0.0),
+            'error': FLUSH_ERRORS.get(s_class),
+        }
 
     def save(self):
         """ Save current object
         """
-        s_class = self.__class__.__name__
         self.updated_at = datetime.utcnow()
-        DATA[s_class][self.id] = self
-        self.__class__.save_to_file()
+        self.__class__.storage.save(self)
+        self.__class__._notify(self)
 
     def remove(self):
         """ Remove object
         """
-        s_class = self.__class__.__name__
-        if DATA[s_class].get(self.id) is not None:
-            del DATA[s_class][self.id]
-            self.__class__.save_to_file()
+        if self.__class__.storage.remove(self):
+            self.__class__._notify(self)
+
+    @classmethod
+    def add_listener(cls, callback):
+        """ Call callback(obj) after every save() or remove() of an object
+        of this class
+
+        A bound method is held through a weak reference: the listener
+        goes away with its object instead of keeping it alive.
+        """
+        if hasattr(callback, '__self__') and hasattr(callback, '__func__'):
+            ref = weakref.WeakMethod(callback)
+        else:
+            def ref():
+                return callback
+        with _listeners_lock:
+            LISTENERS.setdefault(cls.__name__, []).append(ref)
+
+    @classmethod
+    def _notify(cls, obj: TypeVar('Base')):
+        """ Run the listeners of this class for obj, dropping those whose
+        object is gone
+        """
+        dead = False
+        for ref in LISTENERS.get(cls.__name__, ()):
+            callback = ref()
+            if callback is None:
+                dead = True
+            else:
+                callback(obj)
+        if dead:
+            with _listeners_lock:
+                LISTENERS[cls.__name__] = [
+                    ref for ref in LISTENERS[cls.__name__]
+                    if ref() is not None]
+
+    @classmethod
+    def _build_indexes(cls, objs: dict) -> Tuple[dict, dict]:
+        """ Attribute indexes of objs, and the indexed values of each
+        """
+        indexes = {attr: {} for attr in cls.indexed_attributes}
+        indexed_values = {}
+        if indexes:
+            for obj in objs.values():
+                values = {}
+                for attr, index in indexes.items():
+                    value = getattr(obj, attr, None)
+                    index.setdefault(value, {})[obj.id] = obj
+                    values[attr] = value
+                indexed_values[obj.id] = values
+        return indexes, indexed_values
+
+    @classmethod
+    def _rebuild_indexes(cls):
+        """ Rebuild all attribute indexes from DATA
+        """
+        s_class = cls.__name__
+        indexes, indexed_values = cls._build_indexes(DATA.get(s_class, {}))
+        INDEXES[s_class] = indexes
+        INDEXED_VALUES[s_class] = indexed_values
+        # Sorted indexes are rebuilt on their next use
+        ORDERED.pop(s_class, None)
+        ORDER_KEYS.pop(s_class, None)
+        SORTED_VALUES.pop(s_class, None)
+
+    @classmethod
+    def _index(cls, obj: TypeVar('Base')):
+        """ Add (or refresh) obj in the attribute indexes
+        """
+        if not cls.indexed_attributes:
+            return
+        s_class = cls.__name__
+        values = {attr: getattr(obj, attr, None)
+                  for attr in cls.indexed_attributes}
+        if INDEXED_VALUES.get(s_class, {}).get(obj.id) != values:
+            cls._unindex(obj.id)
+        indexes = INDEXES.setdefault(s_class, {})
+        for attr, value in values.items():
+            index = indexes.setdefault(attr, {})
+            bucket = index.get(value)
+            if bucket is None:
+                bucket = index[value] = {}
+                cls._sort_value(attr, value)
+            bucket[obj.id] = obj
+        INDEXED_VALUES.setdefault(s_class, {})[obj.id] = values
+
+    @classmethod
+    def _unindex(cls, obj_id: str):
+        """ Remove an object ID from the attribute indexes
+        """
+        s_class = cls.__name__
+        values = INDEXED_VALUES.get(s_class, {}).pop(obj_id, None)
+        if values is None:
+            return
+        for attr, value in values.items():
+            index = INDEXES[s_class][attr]
+            bucket = index.get(value)
+            if bucket is None:
+                continue
+            bucket.pop(obj_id, None)
+            if len(bucket) == 0:
+                del index[value]
+                cls._sort_value(attr, value, remove=True)
+
+    @classmethod
+    def _sorted_values(cls, attr: str, reverse: bool = False) -> list:
+        """ Sorted string values of the index of attr (each reversed if
+        reverse, for suffix searches): built on first use, then kept up
+        to date with the index
+        """
+        s_class = cls.__name__
+        sorted_values = SORTED_VALUES.setdefault(s_class, {})
+        values = sorted_values.get((attr, reverse))
+        if values is None:
+            values = sorted(value[::-1] if reverse else value
+                            for value in INDEXES[s_class][attr]
+                            if isinstance(value, str))
+            sorted_values[(attr, reverse)] = values
+        return values
+
+    @classmethod
+    def _sort_value(cls, attr: str, value, remove: bool = False):
+        """ Add (or remove) a value of the index of attr to (from) its
+        built sorted values
+        """
+        sorted_values = SORTED_VALUES.get(cls.__name__)
+        if not sorted_values or not isinstance(value, str):
+            return
+        for reverse in (False, True):
+            values = sorted_values.get((attr, reverse))
+            if values is None:
+                continue
+            key = value[::-1] if reverse else value
+            if not remove:
+                insort(values, key)
+                continue
+            i = bisect_left(values, key)
+            if i < len(values) and values[i] == key:
+                del values[i]
+
+    @classmethod
+    def _ordered_keys(cls) -> list:
+        """ Sorted (created_at, id) of every object: built on first use,
+        then kept up to date by save() and remove()
+        """
+        s_class = cls.__name__
+        keys = ORDERED.get(s_class)
+        if keys is None:
+            # Concurrent readers may both build it: to the same result,
+            # since no writer runs alongside them
+            order_keys = {obj_id: (obj.created_at, obj_id)
+                          for obj_id, obj in DATA.get(s_class, {}).items()}
+            keys = sorted(order_keys.values())
+            ORDER_KEYS[s_class] = order_keys
+            ORDERED[s_class] = keys
+        return keys
+
+    @classmethod
+    def _order(cls, obj: TypeVar('Base')):
+        """ Add (or move) obj in the ordered key index, if built
+        """
+        s_class = cls.__name__
+        keys = ORDERED.get(s_class)
+        if keys is None:
+            return
+        key = (obj.created_at, obj.id)
+        if ORDER_KEYS[s_class].get(obj.id) == key:
+            return
+        cls._unorder(obj.id)
+        insort(keys, key)
+        ORDER_KEYS[s_class][obj.id] = key
+
+    @classmethod
+    def _unorder(cls, obj_id: str):
+        """ Remove an object ID from the ordered key index, if built
+        """
+        s_class = cls.__name__
+        keys = ORDERED.get(s_class)
+        if keys is None:
+            return
+        key = ORDER_KEYS[s_class].pop(obj_id, None)
+        if key is None:
+            return
+        i = bisect_left(keys, key)
+        if i < len(keys) and keys[i] == key:
+            del keys[i]
+
+    @staticmethod
+    def cursor_of(obj: TypeVar('Base')) -> str:
+        """ Opaque page() cursor pointing just after obj
+        """
+        raw = "{} {}".format(obj.created_at.isoformat(), obj.id)
+        return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+    @staticmethod
+    def parse_cursor(cursor: str) -> tuple:
+        """ (created_at, id) key of a cursor_of() cursor, ValueError if
+        the cursor is malformed
+        """
+        raw = base64.urlsafe_b64decode(cursor.encode('utf-8'))
+        created_at, obj_id = raw.decode('utf-8').split(" ", 1)
+        created_at = datetime.fromisoformat(created_at)
+        if created_at.tzinfo is not None:
+            raise ValueError("Invalid cursor")
+        return (created_at, obj_id)
+
+    @classmethod
+    def page(cls, limit: int = None,
+             cursor: str = None) -> Tuple[List[TypeVar('Base')], str]:
+        """ Up to limit objects following cursor, in (created_at, id)
+        order, and the cursor of the next page (None after the last one)
+        """
+        return cls.storage.page(cls, limit, cursor)
 
     @classmethod
     def count(cls) -> int:
         """ Count all objects
         """
-        s_class = cls.__name__
-        return len(DATA[s_class].keys())
+        return cls.storage.count(cls)
 
     @classmethod
     def all(cls) -> Iterable[TypeVar('Base')]:
@@ -118,14 +808,294 @@ class Base():
     def get(cls, id: str) -> TypeVar('Base'):
         """ Return one object by ID
         """
-        s_class = cls.__name__
-        return DATA[s_class].get(id)
+        return cls.storage.get(cls, id)
 
     @classmethod
-    def search(cls, attributes: dict = {}) -> List[TypeVar('Base')]:
+    def search(cls, attributes: dict = None) -> List[TypeVar('Base')]:
         """ Search all objects with matching attributes
         """
+        if attributes is None:
+            attributes = {}
+        return cls.storage.search(cls, attributes)
+
+    @classmethod
+    def query(cls) -> Query:
+        """ New Query on the objects of this class
+        """
+        return Query(cls)
+
+
+class Storage():
+    """ Storage backend interface
+
+    Base delegates loading, saving, removing and querying its objects to
+    the backend in its `storage` class attribute.
+    """
+
+    def load(self, cls: type):
+        """ Prepare the storage of cls (Base.load_from_file)
+        """
+        raise NotImplementedError()
+
+    def reload_if_changed(self, cls: type) -> bool:
+        """ Pick up the changes of other processes, return True when the
+        objects of cls were reloaded
+        """
+        return False
+
+    def flush(self, cls: type):
+        """ Write the pending mutations of cls now
+        """
+
+    def save(self, obj: Base):
+        """ Insert or update obj
+        """
+        raise NotImplementedError()
+
+    def remove(self, obj: Base) -> bool:
+        """ Delete obj, return False if it was not stored
+        """
+        raise NotImplementedError()
+
+    def get(self, cls: type, obj_id: str) -> Base:
+        """ Object of cls with this ID, None if there is none
+        """
+        raise NotImplementedError()
+
+    def search(self, cls: type, attributes: dict) -> List[Base]:
+        """ Objects of cls whose attributes equal these
+        """
+        raise NotImplementedError()
+
+    def count(self, cls: type) -> int:
+        """ Number of objects of cls
+        """
+        raise NotImplementedError()
+
+    def page(self, cls: type, limit: int,
+             cursor: str) -> Tuple[List[Base], str]:
+        """ See Base.page
+        """
+        raise NotImplementedError()
+
+    def query(self, cls: type, query: Query) -> Iterator[Base]:
+        """ Results of a Query on cls
+        """
+        raise NotImplementedError()
+
+
+class JSONStorage(Storage):
+    """ Default backend: every object in memory (DATA), each class saved
+    to .db_<Class>.json (see Base.journal and Base.flush_interval)
+    """
+
+    def load(self, cls: type):
+        """ Load all objects of cls from file
+
+        The objects and their indexes are built aside while readers go
+        on with the current ones, then swapped in at once.
+        """
         s_class = cls.__name__
+        self.flush(cls)
+        generation = GENERATIONS.get(s_class, 0)
+        loaded = self._read_files(cls)
+        with _data_lock.write():
+            if GENERATIONS.get(s_class, 0) != generation:
+                # Saved to meanwhile: read again, writers kept out
+                self.flush(cls)
+                loaded = self._read_files(cls)
+            objs, indexes, indexed_values, offset, signature = loaded
+            DATA[s_class] = objs
+            INDEXES[s_class] = indexes
+            INDEXED_VALUES[s_class] = indexed_values
+            ORDERED.pop(s_class, None)
+            ORDER_KEYS.pop(s_class, None)
+            SORTED_VALUES.pop(s_class, None)
+            JOURNAL_OFFSETS[s_class] = offset
+            FILE_SIGNATURES[s_class] = signature
+
+    @staticmethod
+    def _read_files(cls: type) -> tuple:
+        """ Objects of cls in its snapshot and journal, their indexes,
+        the journal offset read up to and the files signature
+        """
+        s_class = cls.__name__
+        file_path = ".db_{}.json".format(s_class)
+        objs_json = {}
+        records = []
+        offset = 0
+        # Files read under the file lock: no other process compacts the
+        # journal between the snapshot and the journal reads
+        with _write_lock, cls._file_lock():
+            signature = cls._file_signature()
+            if path.exists(file_path):
+                with open(file_path, 'r') as f:
+                    objs_json = json.load(f)
+            for offset, record in cls._read_journal():
+                records.append(record)
+        memo = {}
+        from_json = cls.from_json
+        objs = {obj_id: from_json(obj_json, memo)
+                for obj_id, obj_json in objs_json.items()}
+        for record in records:
+            if record['obj'] is None:
+                objs.pop(record['id'], None)
+            else:
+                objs[record['id']] = from_json(record['obj'])
+        indexes, indexed_values = cls._build_indexes(objs)
+        return objs, indexes, indexed_values, offset, signature
+
+    def reload_if_changed(self, cls: type) -> bool:
+        """ Reload from file only if another writer changed it since the
+        last load, checking at most once per reload_interval seconds
+
+        Records appended to the journal since are applied alone; any
+        other change (e.g. a compaction) reloads everything.
+        """
+        s_class = cls.__name__
+        if s_class not in DATA:
+            self.load(cls)
+            return True
+        if cls.reload_interval > 0:
+            now = time.monotonic()
+            if now < NEXT_RELOAD_CHECKS.get(s_class, 0):
+                return False
+            NEXT_RELOAD_CHECKS[s_class] = now + cls.reload_interval
+        return self.catch_up(cls)
+
+    def catch_up(self, cls: type) -> bool:
+        """ Apply what other processes wrote to the files of cls since
+        the last read, return True when they had changed
+
+        Records appended to the journal since are applied alone; any
+        other change (e.g. a compaction) reloads everything.
+        """
+        s_class = cls.__name__
+        signature = cls._file_signature()
+        if FILE_SIGNATURES.get(s_class) == signature:
+            return False
+        if not self._journal_grew(FILE_SIGNATURES.get(s_class),
+                                  signature) or \
+                not self._apply_journal_tail(cls):
+            self.load(cls)
+        return True
+
+    @staticmethod
+    def _journal_grew(known: tuple, signature: tuple) -> bool:
+        """ Whether the only change from the files signature known to
+        signature is records appended to the journal
+        """
+        return known is not None and known[0] == signature[0] and \
+            signature[1] is not None and (known[1] is None or (
+                known[1][0] == signature[1][0] and
+                known[1][1] <= signature[1][1]))
+
+    def _apply_journal_tail(self, cls: type) -> bool:
+        """ Apply the journal records appended since the last read,
+        return False (nothing applied) when the files changed otherwise
+        """
+        s_class = cls.__name__
+        with _data_lock.write(), _write_lock, cls._file_lock():
+            signature = cls._file_signature()
+            if not self._journal_grew(FILE_SIGNATURES.get(s_class),
+                                      signature):
+                return False
+            objs = DATA[s_class]
+            offset = JOURNAL_OFFSETS.get(s_class, 0)
+            for offset, record in cls._read_journal(offset, repair=False):
+                obj_id = record['id']
+                if record['obj'] is None:
+                    if objs.pop(obj_id, None) is not None:
+                        cls._unindex(obj_id)
+                        cls._unorder(obj_id)
+                else:
+                    obj = cls.from_json(record['obj'])
+                    objs[obj_id] = obj
+                    cls._index(obj)
+                    cls._order(obj)
+            JOURNAL_OFFSETS[s_class] = offset
+            FILE_SIGNATURES[s_class] = signature
+        return True
+
+    def flush(self, cls: type):
+        """ Write the pending mutations of cls now
+        """
+        s_class = cls.__name__
+        # Appending to the journal may compact it (see save_to_file)
+        data_lock = _data_lock.write if cls.journal else _data_lock.read
+        with data_lock(), _write_lock:
+            with _pending_lock:
+                pending = PENDING.pop(s_class, None)
+            if pending is None:
+                return
+            try:
+                if cls.journal:
+                    cls._append_journal(pending['records'])
+                else:
+                    cls.save_to_file()
+            except Exception as e:
+                # Keep the batch, ahead of any newer one, for a retry
+                with _pending_lock:
+                    newer = PENDING.get(s_class)
+                    if newer is not None:
+                        pending['count'] += newer['count']
+                        pending['records'].extend(newer['records'])
+                    PENDING[s_class] = pending
+                FLUSH_ERRORS[s_class] = e
+                raise
+            FLUSH_ERRORS.pop(s_class, None)
+            LAST_FLUSH_LAG[s_class] = time.monotonic() - pending['since']
+
+    def save(self, obj: Base):
+        """ Store obj in DATA and its indexes, then persist it
+        """
+        cls = obj.__class__
+        # A whole-file rewrite runs after the write lock is released:
+        # readers go on meanwhile. Journal records and pending flushes
+        # are queued under it, in the order of the mutations.
+        rewrite = not cls.journal and cls.flush_interval <= 0
+        with _data_lock.write():
+            GENERATIONS[cls.__name__] = GENERATIONS.get(cls.__name__, 0) + 1
+            DATA[cls.__name__][obj.id] = obj
+            cls._index(obj)
+            cls._order(obj)
+            if not rewrite:
+                cls._persist(obj.id, obj)
+        if rewrite:
+            cls._persist(obj.id, obj)
+
+    def remove(self, obj: Base) -> bool:
+        """ Drop obj from DATA and its indexes, then persist its removal
+        """
+        cls = obj.__class__
+        rewrite = not cls.journal and cls.flush_interval <= 0
+        with _data_lock.write():
+            objs = DATA[cls.__name__]
+            if objs.get(obj.id) is None:
+                return False
+            del objs[obj.id]
+            GENERATIONS[cls.__name__] = GENERATIONS.get(cls.__name__, 0) + 1
+            cls._unindex(obj.id)
+            cls._unorder(obj.id)
+            if not rewrite:
+                cls._persist(obj.id)
+        if rewrite:
+            cls._persist(obj.id)
+        return True
+
+    def get(self, cls: type, obj_id: str) -> Base:
+        """ Object of cls with this ID (one dict lookup: atomic, no lock)
+        """
+        if cls.reload_interval >= 0:
+            self.reload_if_changed(cls)
+        return DATA[cls.__name__].get(obj_id)
+
+    def search(self, cls: type, attributes: dict) -> List[Base]:
+        """ Objects of cls with matching attributes, looked up in the
+        index of the first indexed attribute searched on
+        """
+        s_class = cls.__name__
+
         def _search(obj):
             if len(attributes) == 0:
                 return True
@@ -133,5 +1103,238 @@ class Base():
                 if (getattr(obj, k) != v):
                     return False
             return True
-        
-        return list(filter(_search, DATA[s_class].values()))
+
+        if cls.reload_interval >= 0:
+            self.reload_if_changed(cls)
+        with _data_lock.read():
+            objs = DATA[s_class].values()
+            for k in cls.indexed_attributes:
+                if k not in attributes:
+                    continue
+                try:
+                    bucket = INDEXES[s_class][k].get(attributes[k], {})
+                except (KeyError, TypeError):
+                    break
+                objs = bucket.values()
+                break
+            return list(filter(_search, objs))
+
+    def count(self, cls: type) -> int:
+        """ Number of objects of cls
+        """
+        if cls.reload_interval >= 0:
+            self.reload_if_changed(cls)
+        return len(DATA[cls.__name__].keys())
+
+    def page(self, cls: type, limit: int,
+             cursor: str) -> Tuple[List[Base], str]:
+        """ Page of the ordered key index of cls
+        """
+        s_class = cls.__name__
+        key = None if cursor is None else cls.parse_cursor(cursor)
+        if cls.reload_interval >= 0:
+            self.reload_if_changed(cls)
+        with _data_lock.read():
+            keys = cls._ordered_keys()
+            start = 0 if key is None else bisect_right(keys, key)
+            end = len(keys) if limit is None else start + limit
+            objs = DATA[s_class]
+            page = []
+            for _, obj_id in keys[start:end]:
+                obj = objs.get(obj_id)
+                if obj is not None:
+                    page.append(obj)
+        next_cursor = None
+        if end < len(keys) and page:
+            next_cursor = cls.cursor_of(page[-1])
+        return page, next_cursor
+
+    def query(self, cls: type, query: Query) -> Iterator[Base]:
+        """ Results of a Query on cls: from an attribute index when an
+        indexed attribute is searched on, else from a scan of the
+        ordered key index (created_at range and order for free)
+
+        Scans read scan_chunk keys per hold of the read lock and yield
+        as they go, so that a limit stops them early.
+        """
+        if cls.reload_interval >= 0:
+            self.reload_if_changed(cls)
+        objs = self._indexed_candidates(cls, query)
+        if objs is not None:
+            return query.finish(objs)
+        ordered = query.order is not None and query.order[0] == 'created_at'
+        descending = ordered and query.order[1]
+        low = high = None
+        for op, attr, arg in query.predicates:
+            if op == 'between' and attr == 'created_at':
+                low, high = arg
+                break
+        return query.finish(self._scan(cls, low, high, descending), ordered)
+
+    @staticmethod
+    def _indexed_candidates(cls: type, query: Query) -> List[Base]:
+        """ Objects of cls matching one indexed predicate of query: id or
+        indexed attribute equality or membership, then prefix or suffix
+        of an indexed attribute; None if no index applies
+        """
+        s_class = cls.__name__
+        indexed = cls.indexed_attributes
+        plans = [(op, attr, arg) for op, attr, arg in query.predicates
+                 if op in ('eq', 'in') and (attr == 'id' or attr in indexed)]
+        plans += [(op, attr, arg) for op, attr, arg in query.predicates
+                  if op in ('prefix', 'suffix') and attr in indexed]
+        for op, attr, arg in plans:
+            with _data_lock.read():
+                if op in ('eq', 'in'):
+                    values = [arg] if op == 'eq' else arg
+                    try:
+                        values = dict.fromkeys(values)
+                    except TypeError:
+                        # Unhashable: cannot be an index key
+                        continue
+                    if attr == 'id':
+                        objs = DATA[s_class]
+                        return [objs[value] for value in values
+                                if value in objs]
+                    index = INDEXES[s_class][attr]
+                    return [obj for value in values
+                            for obj in index.get(value, {}).values()]
+                if not isinstance(arg, str):
+                    return []
+                index = INDEXES[s_class][attr]
+                reverse = op == 'suffix'
+                key = arg[::-1] if reverse else arg
+                sorted_values = cls._sorted_values(attr, reverse)
+                objs = []
+                i = bisect_left(sorted_values, key)
+                while i < len(sorted_values) and \
+                        sorted_values[i].startswith(key):
+                    value = sorted_values[i]
+                    objs.extend(index[value[::-1] if reverse else value]
+                                .values())
+                    i += 1
+                return objs
+        return None
+
+    # Keys read per hold of the read lock by a scan
+    scan_chunk = 256
+
+    def _scan(self, cls: type, low: datetime = None, high: datetime = None,
+              descending: bool = False) -> Iterator[Base]:
+        """ Objects of cls in (created_at, id) order, created within
+        [low, high]
+
+        Each chunk resumes after the last key read, so saves and
+        removals between chunks neither skip nor repeat objects.
+        """
+        s_class = cls.__name__
+        last = None
+        while True:
+            with _data_lock.read():
+                keys = cls._ordered_keys()
+                if not descending:
+                    if last is not None:
+                        start = bisect_right(keys, last)
+                    elif low is not None:
+                        start = bisect_left(keys, (low,))
+                    else:
+                        start = 0
+                    chunk = keys[start:start + self.scan_chunk]
+                else:
+                    if last is not None:
+                        end = bisect_left(keys, last)
+                    elif high is not None:
+                        end = bisect_right(keys, (high, _MAX_ID))
+                    else:
+                        end = len(keys)
+                    chunk = keys[max(0, end - self.scan_chunk):end][::-1]
+                objs = DATA[s_class]
+                batch = [(key[0], objs.get(key[1])) for key in chunk]
+            for created_at, obj in batch:
+                if not descending and high is not None and created_at > high \
+                        or descending and low is not None and created_at < low:
+                    return
+                if obj is not None:
+                    yield obj
+            if len(chunk) < self.scan_chunk:
+                return
+            last = chunk[-1]
+
+
+def get_storage(name: str = None) -> Storage:
+    """ Storage backend named name, or by BASE_STORAGE: 'json' (default)
+    or 'sqlite' (database file BASE_SQLITE_PATH, default .db.sqlite3)
+    """
+    if name is None:
+        name = getenv('BASE_STORAGE', 'json')
+    if name == 'sqlite':
+        from models.sqlite_storage import SQLiteStorage
+        return SQLiteStorage(getenv('BASE_SQLITE_PATH', '.db.sqlite3'))
+    if name != 'json':
+        raise ValueError("Unknown storage backend: {}".format(name))
+    return JSONStorage()
+
+
+def flush_all():
+    """ Write the pending mutations of every class, then raise the error
+    of the first one which failed, if any
+    """
+    with _pending_lock:
+        classes = [pending['cls'] for pending in PENDING.values()]
+    error = None
+    for cls in classes:
+        try:
+            cls.flush()
+        except Exception as e:
+            error = error or e
+    if error is not None:
+        raise error
+
+
+def _flusher_loop():
+    """ Background flusher: write each dirty class once its
+    flush_interval has elapsed
+    """
+    while True:
+        _flusher_wakeup.clear()
+        now = time.monotonic()
+        due = []
+        waits = []
+        with _pending_lock:
+            for pending in PENDING.values():
+                deadline = pending['since'] + pending['cls'].flush_interval
+                if deadline <= now:
+                    due.append(pending['cls'])
+                else:
+                    waits.append(deadline - now)
+        failed = False
+        for cls in due:
+            try:
+                cls.flush()
+            except Exception:
+                # The batch stays pending: retry it after a while
+                logging.getLogger(__name__).exception(
+                    "Flush of %s failed", cls.__name__)
+                failed = True
+        if failed:
+            time.sleep(FLUSH_RETRY_DELAY)
+        if due:
+            continue
+        _flusher_wakeup.wait(min(waits) if waits else None)
+
+
+def _start_flusher():
+    """ Start the background flusher thread once
+    """
+    global _flusher
+    if _flusher is not None:
+        return
+    with _pending_lock:
+        if _flusher is None:
+            _flusher = threading.Thread(target=_flusher_loop,
+                                        name="base-flusher", daemon=True)
+            _flusher.start()
+
+
+Base.storage = get_storage()
+atexit.register(flush_all)
@@ -6,6 +6,7 @@ from os import getenv
 from flask import Flask, jsonify, abort, request
 from flask_cors import CORS
 from api.v1.views import app_views
+from api.v1.auth.auth import PathMatcher
 
 app = Flask(__name__)
 app.register_blueprint(app_views)
@@ -30,6 +31,16 @@ elif auth_type == "session_db_auth":
 else:
     from api.v1.auth.auth import Auth
     auth = Auth()
+# Views read auth from the config of the running app: under
+# `python3 -m api.v1.app` this module is __main__, and importing
+# api.v1.app would build a second app with an auth of its own
+app.config['AUTH'] = auth
+
+# Paths that don't require authentication, compiled once
+EXCLUDED_PATHS = PathMatcher(['/api/v1/status/',
+                              '/api/v1/unauthorized/',
+                              '/api/v1/forbidden/',
+                              '/api/v1/auth_session/login/'])
 
 
 @app.errorhandler(401)
@@ -57,11 +68,7 @@ def before_request() -> str:
     """ Method to filter each request """
     if auth is None:
         return
-    excluded_paths = ['/api/v1/status/',
-                      '/api/v1/unauthorized/',
-                      '/api/v1/forbidden/',
-                      '/api/v1/auth_session/login/']
-    if not auth.require_auth(request.path, excluded_paths):
+    if not auth.require_auth(request.path, EXCLUDED_PATHS):
         return
     if (auth.authorization_header(request) is None
             and auth.session_cookie(request) is None):
@@ -59,5 +59,9 @@ class SessionAuth(Auth):
             return False
         if not self.user_id_for_session_id(session_id):
             return False
-        del self.user_id_by_session_id[session_id]
-        return True
+        # The session may have expired and been evicted since the check
+        return self.forget_session(session_id)
+
+    def forget_session(self, session_id: str) -> bool:
+        """Drops a session ID from memory, returns whether it was there"""
+        return self.user_id_by_session_id.pop(session_id, None) is not None
@@ -15,13 +15,17 @@ class SessionDBAuth(SessionExpAuth):
         
         user_session = UserSession(user_id=user_id, session_id=session_id)
         user_session.save()
+        # Other workers must see the session on their next request
+        UserSession.flush()
         return session_id
 
     def user_id_for_session_id(self, session_id=None):
         """ Returns a User ID based on a Session ID from the database """
         if session_id is None:
             return None
-        UserSession.load_from_file()
+        # Sessions stay resident and indexed by session_id: only re-read
+        # the file when another worker wrote to it
+        UserSession.reload_if_changed()
         sessions = UserSession.search({'session_id': session_id})
         if not sessions:
             return None
@@ -35,11 +39,12 @@ class SessionDBAuth(SessionExpAuth):
         session_id = self.session_cookie(request)
         if session_id is None:
             return False
-        UserSession.load_from_file()
+        UserSession.reload_if_changed()
         sessions = UserSession.search({'session_id': session_id})
         if not sessions:
             return False
         session = sessions[0]
         session.remove()
+        self.forget_session(session_id)
         return True
     
\ No newline at end of file
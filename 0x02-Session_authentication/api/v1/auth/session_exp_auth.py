@@ -5,12 +5,25 @@ authentication with expiration
 """
 from api.v1.auth.session_auth import SessionAuth
 from datetime import datetime, timedelta
+import heapq
 import os
+import threading
 
 
 class SessionExpAuth(SessionAuth):
     """ SessionExpAuth class for session-based authentication with expiration """
-    
+    # Min-heap of (expires_at, session_id): the soonest expiry is on top,
+    # so expired sessions are evicted without scanning every session
+    expiry_heap = []
+    expiry_lock = threading.Lock()
+    expired_count = 0
+    # Entries of sessions destroyed before they expired: the heap is
+    # rebuilt without them once they are half of it, so it grows with
+    # the live sessions, not with the logins of a SESSION_DURATION
+    stale_count = 0
+    # Most expired sessions evicted by a single request
+    sweep_batch = 100
+
     def __init__(self):
         """ Initialize the SessionExpAuth class """
         super().__init__()
@@ -30,12 +43,19 @@ class SessionExpAuth(SessionAuth):
             "created_at": datetime.now()
         }
         self.user_id_by_session_id[session_id] = session_dict
+        if self.session_duration > 0:
+            expires_at = session_dict["created_at"] + \
+                timedelta(seconds=self.session_duration)
+            with self.expiry_lock:
+                heapq.heappush(self.expiry_heap, (expires_at, session_id))
+        self.evict_expired(self.sweep_batch)
         return session_id
 
     def user_id_for_session_id(self, session_id=None):
         """Returns a User ID based on a Session ID with expiration handling"""
         if session_id is None:
             return None
+        self.evict_expired(self.sweep_batch)
         session_dict = self.user_id_by_session_id.get(session_id)
         if session_dict is None:
             return None
@@ -51,3 +71,61 @@ class SessionExpAuth(SessionAuth):
             return None
 
         return session_dict.get("user_id")
+
+    def evict_expired(self, limit: int = None) -> int:
+        """Drop up to limit expired sessions (all of them if limit is None)
+        and return how many were dropped"""
+        if self.session_duration <= 0:
+            return 0
+        now = datetime.now()
+        evicted = 0
+        with self.expiry_lock:
+            while self.expiry_heap and self.expiry_heap[0][0] < now:
+                if limit is not None and evicted >= limit:
+                    break
+                expires_at, session_id = heapq.heappop(self.expiry_heap)
+                session_dict = self.user_id_by_session_id.get(session_id)
+                # Skip entries of sessions already destroyed
+                if not isinstance(session_dict, dict) or \
+                        session_dict.get("created_at") is None:
+                    SessionExpAuth.stale_count = max(
+                        SessionExpAuth.stale_count - 1, 0)
+                    continue
+                created_at = session_dict["created_at"]
+                if created_at + \
+                        timedelta(seconds=self.session_duration) >= now:
+                    continue
+                self.user_id_by_session_id.pop(session_id, None)
+                evicted += 1
+            SessionExpAuth.expired_count += evicted
+        return evicted
+
+    def forget_session(self, session_id: str) -> bool:
+        """Drops a session ID from memory; its heap entry goes with the
+        next compaction of the heap"""
+        if not super().forget_session(session_id):
+            return False
+        if self.session_duration > 0:
+            with self.expiry_lock:
+                SessionExpAuth.stale_count += 1
+                if 2 * SessionExpAuth.stale_count > len(self.expiry_heap):
+                    self.compact_heap()
+        return True
+
+    def compact_heap(self):
+        """Rebuilds the heap without the entries of destroyed sessions
+        (expiry_lock held)"""
+        self.expiry_heap[:] = [
+            entry for entry in self.expiry_heap
+            if isinstance(self.user_id_by_session_id.get(entry[1]), dict)]
+        heapq.heapify(self.expiry_heap)
+        SessionExpAuth.stale_count = 0
+
+    def session_counts(self) -> dict:
+        """Returns the number of live sessions and of sessions evicted
+        since startup"""
+        self.evict_expired()
+        return {
+            "live": len(self.user_id_by_session_id),
+            "expired": SessionExpAuth.expired_count,
+        }
@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 """ Module of Index views
 """
-from flask import jsonify, abort
+from flask import jsonify, abort, current_app
 from api.v1.views import app_views
 
 @app_views.route('/status',
@@ -20,8 +20,11 @@ def stats() -> str:
       - the number of each objects
     """
     from models.user import User
+    auth = current_app.config.get('AUTH')
     stats = {}
     stats['users'] = User.count()
+    if hasattr(auth, 'session_counts'):
+        stats['sessions'] = auth.session_counts()
     return jsonify(stats)
 
 @app_views.route('/api/v1/unauthorized',
@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 """ Module of Session Authentication views """
-from flask import jsonify, request, abort
+from flask import jsonify, request, abort, current_app
 from api.v1.views import app_views
 from models.user import User
 from api.v1.auth.session_db_auth import SessionDBAuth
@@ -26,7 +26,7 @@ def login():
     if not user.is_valid_password(password):
         return jsonify({"error": "wrong password"}), 401
 
-    from api.v1.app import auth
+    auth = current_app.config['AUTH']
     session_id = auth.create_session(user.id)
     response = jsonify(user.to_json())
     response.set_cookie(getenv('SESSION_NAME'), session_id)
@@ -36,7 +36,7 @@ def login():
 @app_views.route('/auth_session/logout', methods=['DELETE'], strict_slashes=False)
 def logout():
     """ DELETE /auth_session/logout """
-    from api.v1.app import auth
+    auth = current_app.config['AUTH']
     if not auth.destroy_session(request):
         abort(404)
     return jsonify({}), 200
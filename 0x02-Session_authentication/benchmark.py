@@ -0,0 +1,546 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the models storage layer
+
+Usage:
+    ./benchmark.py <name> [size ...]
+"""
+import fnmatch
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta
+from models.base import (
+    DATA, INDEXES, ORDERED, TIMESTAMP_FORMAT, Base, JSONStorage
+)
+from models.sqlite_storage import SQLiteStorage
+from models.user import User
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def to_json_uncompiled(obj: Base, for_serialization: bool = False) -> dict:
+    """ Base.to_json before the compiled serializers
+    """
+    result = {}
+    for key in obj._attributes():
+        if not for_serialization and key[0] == '_':
+            continue
+        value = getattr(obj, key, None)
+        if type(value) is datetime:
+            result[key] = value.strftime(TIMESTAMP_FORMAT)
+        else:
+            result[key] = value
+    return result
+
+
+def encode_jsonify(obj) -> bytes:
+    """ obj encoded like jsonify() does (stdlib encoder, keys sorted)
+    """
+    return json.dumps(obj, sort_keys=True, separators=(",", ":")).encode()
+
+
+def encode_fast(obj) -> bytes:
+    """ obj encoded like json_response() of the users views does
+    """
+    if orjson is None:
+        return encode_jsonify(obj)
+    return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS)
+
+
+def populate(size: int) -> list:
+    """ Fill DATA with size users (no file I/O) and return their emails
+    """
+    DATA['User'] = {}
+    emails = []
+    for i in range(size):
+        user = User(email="user{}@example.com".format(i))
+        user.password = "pwd{}".format(i)
+        DATA['User'][user.id] = user
+        emails.append(user.email)
+    User._rebuild_indexes()
+    return emails
+
+
+def login(email: str, pwd: str) -> bool:
+    """ The lookup BasicAuth and /auth_session/login do for every login
+    """
+    users = User.search({'email': email})
+    return len(users) > 0 and users[0].is_valid_password(pwd)
+
+
+def time_logins(emails: list, rounds: int) -> float:
+    """ Average login latency in microseconds
+    """
+    step = max(1, len(emails) // rounds)
+    sample = emails[::step][:rounds]
+    start = time.perf_counter()
+    for email in sample:
+        login(email, "pwd" + email[4:email.index('@')])
+    return (time.perf_counter() - start) / len(sample) * 1e6
+
+
+def bench_search(sizes: list):
+    """ Login latency with and without the email index
+    """
+    print("{:>10} {:>14} {:>14}".format("users", "indexed (us)", "scan (us)"))
+    for size in sizes:
+        emails = populate(size)
+        indexed = time_logins(emails, 1000)
+        User.indexed_attributes = ()
+        scan = time_logins(emails, 5)
+        User.indexed_attributes = ('email',)
+        print("{:>10} {:>14.2f} {:>14.2f}".format(size, indexed, scan))
+
+
+def bench_writes(sizes: list):
+    """ save() throughput on a store of each size, per persistence mode
+    """
+    modes = [
+        ('rewrite', False, 0),
+        ('journal', True, 0),
+        ('deferred', False, 0.05),
+        ('deferred+journal', True, 0.05),
+    ]
+    print("{:>10} {:>18} {:>12}".format("users", "mode", "saves/s"))
+    cwd = os.getcwd()
+    for size in sizes:
+        populate(size)
+        users = list(DATA['User'].values())
+        for name, journal, interval in modes:
+            with tempfile.TemporaryDirectory() as tmp:
+                os.chdir(tmp)
+                User.journal, User.flush_interval = journal, interval
+                User.save_to_file()
+                rounds = min(len(users), 200)
+                start = time.perf_counter()
+                for user in users[:rounds]:
+                    user.save()
+                User.flush()
+                elapsed = time.perf_counter() - start
+                os.chdir(cwd)
+            print("{:>10} {:>18} {:>12.0f}".format(
+                size, name, rounds / elapsed))
+        User.journal, User.flush_interval = False, 0
+
+
+def require_auth_loop(path: str, excluded_paths: list) -> bool:
+    """ Auth.require_auth before PathMatcher: fnmatch every pattern
+    """
+    if not path.endswith('/'):
+        path += '/'
+    for excluded_path in excluded_paths:
+        if not excluded_path.endswith('/'):
+            excluded_path += '/'
+        if fnmatch.fnmatch(path, excluded_path):
+            return False
+    return True
+
+
+def bench_paths(sizes: list):
+    """ require_auth cost for each number of excluded paths
+    """
+    from api.v1.auth.auth import Auth, PathMatcher
+
+    auth = Auth()
+    print("{:>10} {:>12} {:>14}".format("patterns", "loop (us)",
+                                        "matcher (us)"))
+    for size in sizes:
+        excluded = ["/api/v1/static{}/".format(i) for i in range(size // 2)]
+        excluded += ["/api/v1/public{}/*".format(i)
+                     for i in range(size - len(excluded))]
+        matcher = PathMatcher(excluded)
+        paths = ["/api/v1/users/{}".format(i) for i in range(500)]
+        paths += ["/api/v1/public{}/x".format(size - size // 2 - 1)] * 500
+        results = []
+        for check in (lambda p: require_auth_loop(p, excluded),
+                      lambda p: auth.require_auth(p, matcher)):
+            start = time.perf_counter()
+            for path in paths:
+                check(path)
+            results.append((time.perf_counter() - start) / len(paths) * 1e6)
+        print("{:>10} {:>12.2f} {:>14.2f}".format(size, *results))
+
+
+class DictUser():
+    """ A User as stored before __slots__: attributes in a __dict__
+    """
+
+    def __init__(self, email: str):
+        self.id = str(uuid.uuid4())
+        self.created_at = datetime.utcnow()
+        self.updated_at = datetime.utcnow()
+        self.email = email
+        self._password = None
+        self.first_name = None
+        self.last_name = None
+
+
+def bytes_per_user(factory, size: int) -> float:
+    """ Traced memory of size users built by factory, per user
+    """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    users = [factory("user{}@example.com".format(i)) for i in range(size)]
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del users
+    return used / size
+
+
+def bench_memory(sizes: list):
+    """ Resident bytes per user, __dict__ vs __slots__ models
+    """
+    print("{:>10} {:>14} {:>14}".format("users", "__dict__ (B)",
+                                        "__slots__ (B)"))
+    for size in sizes:
+        legacy = bytes_per_user(DictUser, size)
+        compact = bytes_per_user(lambda email: User(email=email), size)
+        print("{:>10} {:>14.0f} {:>14.0f}".format(size, legacy, compact))
+
+
+def bench_startup(sizes: list):
+    """ load_from_file time: kwargs constructor + strptime vs bulk loader
+    """
+    print("{:>10} {:>12} {:>12}".format("users", "before (s)", "after (s)"))
+    cwd = os.getcwd()
+    for size in sizes:
+        populate(size)
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            User.save_to_file()
+            start = time.perf_counter()
+            with open(".db_User.json") as f:
+                objs_json = json.load(f)
+            loaded = {}
+            for obj_id, obj_json in objs_json.items():
+                obj = User(**obj_json)
+                # Before parse_timestamp: two strptime calls per row
+                obj.created_at = datetime.strptime(obj_json['created_at'],
+                                                   TIMESTAMP_FORMAT)
+                obj.updated_at = datetime.strptime(obj_json['updated_at'],
+                                                   TIMESTAMP_FORMAT)
+                loaded[obj_id] = obj
+            before = time.perf_counter() - start
+            del loaded, objs_json
+            start = time.perf_counter()
+            User.load_from_file()
+            after = time.perf_counter() - start
+            os.chdir(cwd)
+        print("{:>10} {:>12.2f} {:>12.2f}".format(size, before, after))
+
+
+def time_each(func, args: list) -> float:
+    """ Average microseconds of func(arg) over args
+    """
+    start = time.perf_counter()
+    for arg in args:
+        func(arg)
+    return (time.perf_counter() - start) / len(args) * 1e6
+
+
+def bench_storage(sizes: list):
+    """ JSON vs SQLite storage: load, save, get, search, count, page
+    """
+    print("{:>10} {:>8} {:>9} {:>9} {:>9} {:>11} {:>10} {:>10}".format(
+        "users", "backend", "load (s)", "saves/s", "get (us)",
+        "search (us)", "count (us)", "page (us)"))
+    cwd = os.getcwd()
+    for size in sizes:
+        emails = populate(size)
+        users = list(DATA['User'].values())
+        for name in ('json', 'sqlite'):
+            with tempfile.TemporaryDirectory() as tmp:
+                os.chdir(tmp)
+                if name == 'json':
+                    User.storage = JSONStorage()
+                    User.save_to_file()
+                else:
+                    User.storage = SQLiteStorage(".db.sqlite3")
+                    User.storage.save_many(users)
+                start = time.perf_counter()
+                User.load_from_file()
+                load = time.perf_counter() - start
+                # A JSON save() rewrites the whole file: fewer rounds
+                rounds = min(size, 10 if name == 'json' else 1000)
+                start = time.perf_counter()
+                for user in users[:rounds]:
+                    user.save()
+                saves = rounds / (time.perf_counter() - start)
+                User.page(1)
+                ids = [user.id for user in users[::max(1, size // 1000)]]
+                get = time_each(User.get, ids)
+                search = time_each(lambda e: User.search({'email': e}),
+                                   emails[::max(1, size // 1000)])
+                count = time_each(lambda _: User.count(), range(100))
+                page = time_each(lambda _: User.page(100), range(100))
+                if name == 'sqlite':
+                    User.storage.close()
+                os.chdir(cwd)
+            print("{:>10} {:>8} {:>9.2f} {:>9.1f} {:>9.1f} {:>11.1f} "
+                  "{:>10.1f} {:>10.1f}".format(size, name, load, saves, get,
+                                               search, count, page))
+        User.storage = JSONStorage()
+
+
+def bench_reload(sizes: list):
+    """ Picking up 10 users saved by another process: full reload vs
+    journal tail, and the cost of an unchanged check
+    """
+    print("{:>10} {:>10} {:>10} {:>14} {:>16}".format(
+        "users", "full (s)", "tail (ms)", "unchanged (us)",
+        "throttled (us)"))
+    cwd = os.getcwd()
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            populate(size)
+            User.journal = True
+            User.save_to_file()
+            User.load_from_file()
+            records = "".join(json.dumps({
+                'id': user.id, 'obj': user.to_json(True)}) + "\n"
+                for user in (User(email="other{}@example.com".format(i))
+                             for i in range(10)))
+            with open(".db_User.journal", "a") as f:
+                f.write(records)
+            start = time.perf_counter()
+            User.load_from_file()
+            full = time.perf_counter() - start
+            with open(".db_User.journal", "a") as f:
+                f.write(records)
+            start = time.perf_counter()
+            User.reload_if_changed()
+            tail = time.perf_counter() - start
+            unchanged = time_each(lambda _: User.reload_if_changed(),
+                                  range(1000))
+            User.reload_interval = 0.1
+            User.reload_if_changed()
+            throttled = time_each(lambda _: User.reload_if_changed(),
+                                  range(1000))
+            User.journal, User.reload_interval = False, -1
+            os.chdir(cwd)
+        print("{:>10} {:>10.2f} {:>10.2f} {:>14.2f} {:>16.2f}".format(
+            size, full, tail * 1000, unchanged, throttled))
+
+
+def bench_query(sizes: list):
+    """ Query builder vs scanning User.all(), on users created one per
+    second over the last size seconds, at 100 email domains
+    """
+    print("{:>10} {:>28} {:>8} {:>12} {:>12}".format(
+        "users", "query", "results", "scan (ms)", "query (ms)"))
+    for size in sizes:
+        populate(size)
+        now = datetime.utcnow()
+        for i, user in enumerate(DATA['User'].values()):
+            user.created_at = now - timedelta(seconds=size - i)
+            user.email = "user{}@d{}.example".format(i, i % 100)
+        User._rebuild_indexes()
+        hour_ago = now - timedelta(hours=1)
+        cases = [
+            ("created in the last hour",
+             lambda u: u.created_at >= hour_ago,
+             lambda: User.query().between('created_at', low=hour_ago)),
+            ("at domain d7.example",
+             lambda u: u.email.endswith("@d7.example"),
+             lambda: User.query().suffix('email', "@d7.example")),
+            ("latest 20 at d7.example",
+             lambda u: u.email.endswith("@d7.example"),
+             lambda: User.query().suffix('email', "@d7.example")
+             .order_by('created_at', descending=True).limit(20)),
+            ("latest 20",
+             None,
+             lambda: User.query().order_by('created_at', descending=True)
+             .limit(20)),
+        ]
+        for name, match, build in cases:
+            build().all()
+            start = time.perf_counter()
+            if match is None:
+                expected = sorted(User.all(), key=lambda u: u.created_at,
+                                  reverse=True)[:20]
+            else:
+                expected = [u for u in User.all() if match(u)]
+                if "latest" in name:
+                    expected.sort(key=lambda u: u.created_at, reverse=True)
+                    expected = expected[:20]
+            scan = time.perf_counter() - start
+            start = time.perf_counter()
+            results = build().all()
+            query = time.perf_counter() - start
+            assert len(results) == len(expected)
+            print("{:>10} {:>28} {:>8} {:>12.2f} {:>12.2f}".format(
+                size, name, len(results), scan * 1000, query * 1000))
+
+
+def bench_serialize(sizes: list):
+    """ GET /api/v1/users body of size users: uncompiled to_json() and
+    jsonify's encoder vs the compiled serializers and json_response's,
+    for the Base.to_json() of 0x01 users (first and cached timestamps),
+    the User.to_json() of 0x02 and the to_json(True) of save_to_file()
+    """
+    print("encoder: {}".format("orjson" if orjson else "json"))
+    print("{:>10} {:>26} {:>12} {:>12}".format(
+        "users", "case", "before (ms)", "after (ms)"))
+    for size in sizes:
+        populate(size)
+        users = User.all()
+        cases = [
+            ("Base.to_json, first", to_json_uncompiled, Base.to_json),
+            ("Base.to_json, cached", to_json_uncompiled, Base.to_json),
+            ("User.to_json", User.to_json, User.to_json),
+            ("to_json(True)", lambda u: to_json_uncompiled(u, True),
+             lambda u: u.to_json(True)),
+        ]
+        for name, before, after in cases:
+            assert [before(u) for u in users[:100]] == \
+                [after(u) for u in users[:100]]
+            if name.endswith("first"):
+                for user in users:
+                    user._formatted = None
+            start = time.perf_counter()
+            old = encode_jsonify([before(u) for u in users])
+            elapsed_before = time.perf_counter() - start
+            start = time.perf_counter()
+            new = encode_fast([after(u) for u in users])
+            elapsed_after = time.perf_counter() - start
+            assert json.loads(old) == json.loads(new)
+            print("{:>10} {:>26} {:>12.2f} {:>12.2f}".format(
+                size, name, elapsed_before * 1000, elapsed_after * 1000))
+
+
+def stress_worker(seed: int, ops: int, barrier: threading.Barrier,
+                  errors: list):
+    """ ops random reads (75%) and writes (saves, updates, removals)
+    """
+    rand = random.Random(seed)
+    barrier.wait()
+    try:
+        for i in range(ops):
+            roll = rand.random()
+            if roll < 0.1:
+                User(email="new{}_{}@example.com".format(seed, i)).save()
+            elif roll < 0.25:
+                users = User.page(1, None)[0] if roll < 0.2 else \
+                    User.search({'email': "user{}@example.com".format(
+                        rand.randrange(1000))})
+                for user in users:
+                    if roll < 0.2:
+                        user.first_name = "n{}".format(i)
+                        user.save()
+                    else:
+                        user.remove()
+            elif roll < 0.5:
+                User.search({'email': "user{}@example.com".format(
+                    rand.randrange(1000))})
+            elif roll < 0.75:
+                User.page(20, None)
+            else:
+                User.search({'first_name': None})[:1]
+    except Exception as e:
+        errors.append(repr(e))
+
+
+def check_consistency() -> list:
+    """ Problems between DATA, its indexes and the file it was saved to
+    """
+    problems = []
+    users = DATA['User']
+    indexed = {obj_id for bucket in INDEXES['User']['email'].values()
+               for obj_id in bucket}
+    if indexed != set(users):
+        problems.append("email index differs from DATA")
+    for user in users.values():
+        if user.id not in INDEXES['User']['email'].get(user.email, {}):
+            problems.append("{} not indexed".format(user.id))
+    keys = ORDERED.get('User')
+    if keys is not None and \
+            keys != sorted((u.created_at, u.id) for u in users.values()):
+        problems.append("ordered key index differs from DATA")
+    User.flush()
+    in_memory = {obj_id: user.to_json(True) for obj_id, user in users.items()}
+    User.load_from_file()
+    on_disk = {obj_id: user.to_json(True)
+               for obj_id, user in DATA['User'].items()}
+    if on_disk != in_memory:
+        problems.append("file differs from memory")
+    return problems
+
+
+def bench_stress(sizes: list):
+    """ Concurrent readers and writers on 1 to 8 threads, per persistence
+    mode, then check DATA, its indexes and the file against each other
+    """
+    modes = [
+        ('rewrite', False, 0),
+        ('journal', True, 0),
+        ('deferred+journal', True, 0.01),
+    ]
+    ops = 2000
+    print("{:>8} {:>18} {:>8} {:>10} {:>7}".format(
+        "users", "mode", "threads", "ops/s", "errors"))
+    cwd = os.getcwd()
+    failed = False
+    for size in sizes:
+        for name, journal, interval in modes:
+            for threads in (1, 2, 4, 8):
+                with tempfile.TemporaryDirectory() as tmp:
+                    os.chdir(tmp)
+                    populate(size)
+                    User.journal, User.flush_interval = journal, interval
+                    User.save_to_file()
+                    barrier = threading.Barrier(threads + 1)
+                    errors = []
+                    workers = [threading.Thread(
+                        target=stress_worker,
+                        args=(seed, ops // threads, barrier, errors))
+                        for seed in range(threads)]
+                    for worker in workers:
+                        worker.start()
+                    barrier.wait()
+                    start = time.perf_counter()
+                    for worker in workers:
+                        worker.join()
+                    elapsed = time.perf_counter() - start
+                    errors += check_consistency()
+                    os.chdir(cwd)
+                print("{:>8} {:>18} {:>8} {:>10.0f} {:>7}".format(
+                    size, name, threads, ops / elapsed, len(errors)))
+                for error in errors[:5]:
+                    print("    " + error)
+                failed = failed or bool(errors)
+        User.journal, User.flush_interval = False, 0
+    if failed:
+        sys.exit(1)
+
+
+BENCHMARKS = {
+    'search': (bench_search, [10000, 100000, 1000000]),
+    'writes': (bench_writes, [10000, 100000, 1000000]),
+    'paths': (bench_paths, [5, 50, 500]),
+    'memory': (bench_memory, [1000000]),
+    'startup': (bench_startup, [100000, 1000000]),
+    'storage': (bench_storage, [100000]),
+    'reload': (bench_reload, [100000]),
+    'query': (bench_query, [100000]),
+    'stress': (bench_stress, [1000]),
+    'serialize': (bench_serialize, [10000, 100000]),
+}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in BENCHMARKS:
+        print("Usage: {} <{}> [size ...]".format(
+            sys.argv[0], "|".join(BENCHMARKS)))
+        sys.exit(1)
+    bench, default_sizes = BENCHMARKS[sys.argv[1]]
+    bench([int(s) for s in sys.argv[2:]] or default_sizes)
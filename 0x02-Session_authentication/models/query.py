@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+""" Query module
+"""
+from itertools import islice
+from typing import Iterator, List, TypeVar
+import heapq
+
+
+class Query():
+    """ Query on the objects of a model, built by chaining predicates:
+
+        (User.query().suffix('email', '@example.com')
+         .between('created_at', low=an_hour_ago)
+         .order_by('created_at', descending=True).limit(20).all())
+
+    Predicates are and-ed. The storage backend runs the query, from an
+    index where one applies, lazily otherwise (see Storage.query).
+    """
+
+    def __init__(self, cls: type):
+        """ Initialize a query matching every object of cls
+        """
+        self.cls = cls
+        # (operator, attribute, argument) of each predicate
+        self.predicates = []
+        self.order = None
+        self.limit_count = None
+        self.offset_count = 0
+
+    def eq(self, attr: str, value) -> 'Query':
+        """ Objects whose attr equals value
+        """
+        self.predicates.append(('eq', attr, value))
+        return self
+
+    def filter(self, **attributes) -> 'Query':
+        """ Objects whose attributes equal these (eq() of each)
+        """
+        for attr, value in attributes.items():
+            self.eq(attr, value)
+        return self
+
+    def in_(self, attr: str, values) -> 'Query':
+        """ Objects whose attr is one of values
+        """
+        self.predicates.append(('in', attr, tuple(values)))
+        return self
+
+    def prefix(self, attr: str, prefix: str) -> 'Query':
+        """ Objects whose (string) attr starts with prefix
+        """
+        self.predicates.append(('prefix', attr, prefix))
+        return self
+
+    def suffix(self, attr: str, suffix: str) -> 'Query':
+        """ Objects whose (string) attr ends with suffix, e.g. the email
+        domain
+        """
+        self.predicates.append(('suffix', attr, suffix))
+        return self
+
+    def between(self, attr: str, low=None, high=None) -> 'Query':
+        """ Objects whose attr is within [low, high], None bounds being
+        open (e.g. created_at from a datetime on)
+        """
+        self.predicates.append(('between', attr, (low, high)))
+        return self
+
+    def order_by(self, attr: str, descending: bool = False) -> 'Query':
+        """ Sort the results on attr (None first), then on id
+        """
+        self.order = (attr, descending)
+        return self
+
+    def limit(self, count: int) -> 'Query':
+        """ Return at most count objects
+        """
+        self.limit_count = count
+        return self
+
+    def offset(self, count: int) -> 'Query':
+        """ Skip the first count objects
+        """
+        self.offset_count = count
+        return self
+
+    def __iter__(self) -> Iterator[TypeVar('Base')]:
+        """ Run the query
+        """
+        return iter(self.cls.storage.query(self.cls, self))
+
+    def all(self) -> List[TypeVar('Base')]:
+        """ All the results
+        """
+        return list(self)
+
+    def first(self) -> TypeVar('Base'):
+        """ First result, None if there is none
+        """
+        return next(iter(self), None)
+
+    def count(self) -> int:
+        """ Number of results
+        """
+        return sum(1 for _ in self)
+
+    def matches(self, obj: TypeVar('Base')) -> bool:
+        """ Whether obj satisfies every predicate
+        """
+        for op, attr, arg in self.predicates:
+            value = getattr(obj, attr, None)
+            if op == 'eq':
+                if value != arg:
+                    return False
+            elif op == 'in':
+                if value not in arg:
+                    return False
+            elif op == 'prefix':
+                if not isinstance(value, str) or not value.startswith(arg):
+                    return False
+            elif op == 'suffix':
+                if not isinstance(value, str) or not value.endswith(arg):
+                    return False
+            elif op == 'between':
+                low, high = arg
+                if value is None or low is not None and value < low or \
+                        high is not None and value > high:
+                    return False
+        return True
+
+    def sort_key(self, obj: TypeVar('Base')) -> tuple:
+        """ Sort key of obj for order_by()
+        """
+        value = getattr(obj, self.order[0], None)
+        return (value is not None, value, obj.id)
+
+    def finish(self, objs: Iterator,
+               ordered: bool = False) -> Iterator[TypeVar('Base')]:
+        """ Filter, sort (unless objs already come in order), offset and
+        limit candidate objects, for backends running part of a query
+        in Python: lazily, but for a sort
+        """
+        objs = (obj for obj in objs if self.matches(obj))
+        stop = None
+        if self.limit_count is not None:
+            stop = self.offset_count + self.limit_count
+        if self.order is not None and not ordered:
+            if stop is None:
+                objs = sorted(objs, key=self.sort_key,
+                              reverse=self.order[1])
+            else:
+                # Only the first stop objects: a heap, not a full sort
+                select = heapq.nlargest if self.order[1] else heapq.nsmallest
+                objs = select(stop, objs, key=self.sort_key)
+        return islice(objs, self.offset_count, stop)
@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+""" SQLite storage backend
+"""
+from datetime import datetime
+from functools import lru_cache
+from os import path
+from typing import Iterable, Iterator, List, Tuple
+import json
+import sqlite3
+import threading
+from models.base import Base, Storage, TIMESTAMP_FORMAT
+from models.query import Query
+
+
+# Sorts after any string starting with the same prefix
+_MAX_CHAR = chr(0x10ffff)
+
+
+def sql_value(value):
+    """ value as compared with a column: datetimes as their stored
+    string (isoformat() is TIMESTAMP_FORMAT, plus any microseconds)
+    """
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+class SQLiteStorage(Storage):
+    """ Storage backend keeping each model in a table of one SQLite
+    database
+
+    Every attribute of the model's __slots__ is a column, as is any other
+    attribute (in the __dict__ of an object) once saved. Indexed
+    attributes and the (created_at, id) page order have SQL indexes, and
+    every write is a transaction of its own. Statements are parameterized
+    so that sqlite3 prepares each of them once per connection.
+
+    Nothing is kept in memory: get()/search() return new objects and see
+    the writes of other processes at once.
+    """
+
+    def __init__(self, database: str = ".db.sqlite3"):
+        """ Initialize the backend for a database file
+        """
+        self.database = database
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._columns = {}
+
+    def connection(self) -> sqlite3.Connection:
+        """ Connection of the current thread, opened on first use
+        """
+        conn = getattr(self._local, 'connection', None)
+        if conn is None:
+            conn = sqlite3.connect(self.database, timeout=30,
+                                   cached_statements=256)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = conn
+        return conn
+
+    def close(self):
+        """ Close the connection of the current thread
+        """
+        conn = getattr(self._local, 'connection', None)
+        if conn is not None:
+            conn.close()
+            self._local.connection = None
+
+    def columns(self, cls: type) -> tuple:
+        """ Columns of the table of cls, created (or completed with new
+        attributes) on first use
+        """
+        columns = self._columns.get(cls)
+        if columns is not None:
+            return columns
+        return self.add_columns(cls, ())
+
+    def add_columns(self, cls: type, names: Iterable[str]) -> tuple:
+        """ Create the table of cls or add its missing columns: the
+        attributes of cls and names, then return all its columns
+        """
+        with self._lock:
+            table = cls.__name__
+            conn = self.connection()
+            with conn:
+                # Write lock first: one process creates and fills the table
+                conn.execute("BEGIN IMMEDIATE")
+                existing = self._table_columns(table)
+                if not existing:
+                    conn.execute('CREATE TABLE "{}" ({})'.format(
+                        table, ", ".join(
+                            '"{}" TEXT PRIMARY KEY'.format(c) if c == 'id'
+                            else '"{}"'.format(c)
+                            for c in cls._slot_names())))
+                self._alter(table, self._table_columns(table),
+                            cls._slot_names() + tuple(names))
+                for attr in cls.indexed_attributes:
+                    conn.execute(
+                        'CREATE INDEX IF NOT EXISTS "ix_{0}_{1}" '
+                        'ON "{0}" ("{1}")'.format(table, attr))
+                conn.execute(
+                    'CREATE INDEX IF NOT EXISTS "ix_{0}_order" '
+                    'ON "{0}" (created_at, id)'.format(table))
+                if not existing:
+                    self._import_json(cls)
+                columns = self._table_columns(table)
+            self._columns[cls] = columns
+        return columns
+
+    def _table_columns(self, table: str) -> tuple:
+        """ Columns of a table, in their order, () if there is no table
+        """
+        return tuple(row[1] for row in self.connection().execute(
+            'PRAGMA table_info("{}")'.format(table)))
+
+    def _alter(self, table: str, existing: tuple, names: Iterable[str]):
+        """ Add the columns names missing from existing to a table
+        """
+        for name in names:
+            if name not in existing:
+                self.connection().execute(
+                    'ALTER TABLE "{}" ADD COLUMN "{}"'.format(table, name))
+                existing += (name,)
+
+    def _import_json(self, cls: type):
+        """ Copy .db_<Class>.json and its journal into the new table, in
+        the transaction creating it
+        """
+        s_class = cls.__name__
+        objs_json = {}
+        file_path = ".db_{}.json".format(s_class)
+        if path.exists(file_path):
+            with open(file_path, 'r') as f:
+                objs_json = json.load(f)
+        journal_path = ".db_{}.journal".format(s_class)
+        if path.exists(journal_path):
+            with open(journal_path, 'r') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break
+                    if record['obj'] is None:
+                        objs_json.pop(record['id'], None)
+                    else:
+                        objs_json[record['id']] = record['obj']
+        if objs_json:
+            # Attributes outside __slots__ too
+            columns = self._table_columns(s_class)
+            self._alter(s_class, columns, sorted(
+                {k for obj_json in objs_json.values() for k in obj_json}))
+            columns = self._table_columns(s_class)
+            self.connection().executemany(
+                self._upsert_sql(s_class, columns),
+                ([obj_json.get(c) for c in columns]
+                 for obj_json in objs_json.values()))
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def _upsert_sql(table: str, columns: tuple) -> str:
+        """ INSERT of a row, UPDATE of the row with the same id
+        """
+        return 'INSERT INTO "{}" ({}) VALUES ({}) ON CONFLICT(id) ' \
+            'DO UPDATE SET {}'.format(
+                table, ", ".join('"{}"'.format(c) for c in columns),
+                ", ".join("?" * len(columns)),
+                ", ".join('"{0}"=excluded."{0}"'.format(c)
+                          for c in columns if c != 'id'))
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def _select_sql(table: str, columns: tuple) -> str:
+        """ SELECT of every column of a table
+        """
+        return 'SELECT {} FROM "{}"'.format(
+            ", ".join('"{}"'.format(c) for c in columns), table)
+
+    def _rows(self, cls: type, where: str = "", params: tuple = (),
+              suffix: str = "") -> Iterator[Base]:
+        """ Objects of cls of the rows matching where, built as they are
+        fetched
+        """
+        columns = self.columns(cls)
+        sql = self._select_sql(cls.__name__, columns)
+        if where:
+            sql += " WHERE " + where
+        rows = self.connection().execute(sql + suffix, params)
+        memo = {}
+        from_json = cls.from_json
+        return (from_json(dict(zip(columns, row)), memo) for row in rows)
+
+    def _select(self, cls: type, where: str = "", params: tuple = (),
+                suffix: str = "") -> List[Base]:
+        """ Objects of cls of the rows matching where
+        """
+        return list(self._rows(cls, where, params, suffix))
+
+    def load(self, cls: type):
+        """ Create the table of cls if needed, and pick up the columns
+        other processes added
+        """
+        self._columns.pop(cls, None)
+        self.columns(cls)
+
+    def save(self, obj: Base):
+        """ Insert or update the row of obj
+        """
+        cls = obj.__class__
+        columns = self.columns(cls)
+        obj_json = obj.to_json(True)
+        if any(k not in columns for k in obj_json):
+            columns = self.add_columns(cls, obj_json)
+        conn = self.connection()
+        with conn:
+            conn.execute(self._upsert_sql(cls.__name__, columns),
+                         [obj_json.get(c) for c in columns])
+
+    def save_many(self, objs: List[Base]):
+        """ Insert or update the rows of objs (all of the same class) in
+        one transaction
+        """
+        if not objs:
+            return
+        cls = objs[0].__class__
+        columns = self.columns(cls)
+        objs_json = [obj.to_json(True) for obj in objs]
+        names = {k for obj_json in objs_json for k in obj_json}
+        if any(k not in columns for k in names):
+            columns = self.add_columns(cls, sorted(names))
+        conn = self.connection()
+        with conn:
+            conn.executemany(self._upsert_sql(cls.__name__, columns), (
+                [obj_json.get(c) for c in columns]
+                for obj_json in objs_json))
+
+    def remove(self, obj: Base) -> bool:
+        """ Delete the row of obj
+        """
+        self.columns(obj.__class__)
+        conn = self.connection()
+        with conn:
+            cursor = conn.execute('DELETE FROM "{}" WHERE id = ?'.format(
+                obj.__class__.__name__), (obj.id,))
+        return cursor.rowcount > 0
+
+    def get(self, cls: type, obj_id: str) -> Base:
+        """ Object of cls with this ID
+        """
+        objs = self._select(cls, "id = ?", (obj_id,))
+        return objs[0] if objs else None
+
+    def search(self, cls: type, attributes: dict) -> List[Base]:
+        """ Objects of cls with matching attributes: columns are matched
+        in SQL, any other attribute on the objects
+        """
+        columns = self.columns(cls)
+        clauses = []
+        params = []
+        others = {}
+        for k, v in attributes.items():
+            if k not in columns:
+                others[k] = v
+            elif v is None:
+                clauses.append('"{}" IS NULL'.format(k))
+            else:
+                clauses.append('"{}" = ?'.format(k))
+                params.append(sql_value(v))
+        objs = self._select(cls, " AND ".join(clauses), tuple(params))
+        if others:
+            objs = [obj for obj in objs
+                    if all(getattr(obj, k) == v for k, v in others.items())]
+        return objs
+
+    def count(self, cls: type) -> int:
+        """ Number of rows of cls
+        """
+        self.columns(cls)
+        return self.connection().execute(
+            'SELECT COUNT(*) FROM "{}"'.format(cls.__name__)).fetchone()[0]
+
+    def page(self, cls: type, limit: int,
+             cursor: str) -> Tuple[List[Base], str]:
+        """ Page of the (created_at, id) index of cls
+        """
+        where = ""
+        params = ()
+        if cursor is not None:
+            created_at, obj_id = cls.parse_cursor(cursor)
+            where = "(created_at, id) > (?, ?)"
+            params = (created_at.strftime(TIMESTAMP_FORMAT), obj_id)
+        # One row more than asked tells whether there is a next page
+        size = -1 if limit is None else limit + 1
+        objs = self._select(cls, where, params + (size,),
+                            " ORDER BY created_at, id LIMIT ?")
+        next_cursor = None
+        if limit is not None and len(objs) > limit:
+            objs = objs[:limit]
+            next_cursor = cls.cursor_of(objs[-1])
+        return objs, next_cursor
+
+    def query(self, cls: type, query: Query) -> Iterator[Base]:
+        """ Results of a Query on cls: predicates, order, limit and
+        offset on columns run in SQL (on its indexes), any other in
+        Python over the rows as they are fetched
+        """
+        columns = self.columns(cls)
+        clauses = []
+        params = []
+        rest = Query(cls)
+        for op, attr, arg in query.predicates:
+            if attr not in columns:
+                rest.predicates.append((op, attr, arg))
+                continue
+            column = '"{}"'.format(attr)
+            if op == 'eq':
+                if arg is None:
+                    clauses.append(column + " IS NULL")
+                else:
+                    clauses.append(column + " = ?")
+                    params.append(sql_value(arg))
+            elif op == 'in':
+                values = [sql_value(v) for v in arg if v is not None]
+                clause = "{} IN ({})".format(
+                    column, ", ".join("?" * len(values)))
+                if len(values) < len(arg):
+                    clause = "({} OR {} IS NULL)".format(clause, column)
+                clauses.append(clause)
+                params.extend(values)
+            elif op in ('prefix', 'suffix') and not isinstance(arg, str):
+                clauses.append("0")
+            elif op == 'prefix':
+                # A range, unlike LIKE: uses the index, case-sensitive
+                clauses.append("{0} >= ? AND {0} < ?".format(column))
+                params.extend((arg, arg + _MAX_CHAR))
+            elif op == 'suffix':
+                clauses.append("typeof({}) = 'text'".format(column))
+                if arg:
+                    clauses.append("substr({}, ?) = ?".format(column))
+                    params.extend((-len(arg), arg))
+            elif op == 'between':
+                low, high = arg
+                clauses.append(column + " IS NOT NULL")
+                if low is not None:
+                    clauses.append(column + " >= ?")
+                    params.append(sql_value(low))
+                if high is not None:
+                    clauses.append(column + " <= ?")
+                    params.append(sql_value(high))
+        suffix = ""
+        if query.order is not None and query.order[0] in columns:
+            direction = " DESC" if query.order[1] else ""
+            suffix = ' ORDER BY "{}"{}, id{}'.format(
+                query.order[0], direction, direction)
+        else:
+            rest.order = query.order
+        if rest.predicates or rest.order is not None:
+            rest.limit_count = query.limit_count
+            rest.offset_count = query.offset_count
+        elif query.limit_count is not None or query.offset_count:
+            suffix += " LIMIT ? OFFSET ?"
+            params.append(-1 if query.limit_count is None
+                          else query.limit_count)
+            params.append(query.offset_count)
+        return rest.finish(self._rows(cls, " AND ".join(clauses),
+                                      tuple(params), suffix))
@@ -8,6 +8,8 @@ from models.base import Base
 class User(Base):
     """ User class
     """
+    __slots__ = ('email', '_password', 'first_name', 'last_name')
+    indexed_attributes = ('email',)
 
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a User instance
@@ -57,9 +59,11 @@ class User(Base):
             return "{}".format(self.last_name)
         else:
             return "{} {}".format(self.first_name, self.last_name)
-        
-    def to_json(self):
+
+    def to_json(self, for_serialization: bool = False):
         """ Returns a dictionary representation of the User instance """
+        if for_serialization:
+            return super().to_json(True)
         return {
             'id': self.id,
             'email': self.email,
@@ -5,7 +5,12 @@ from models.base import Base
 
 class UserSession(Base):
     """ UserSession class for session storage """
-    
+    __slots__ = ('user_id', 'session_id')
+    indexed_attributes = ('session_id',)
+    # Every worker creates sessions: each one appends its own to the
+    # journal instead of rewriting the file from its stale copy
+    journal = True
+
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize the UserSession class """
         super().__init__(*args, **kwargs)
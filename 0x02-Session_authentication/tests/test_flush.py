@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+""" Tests of the deferred writes of the JSON storage
+"""
+import os
+import tempfile
+import time
+import unittest
+from models import base
+from models.base import DATA, flush_all
+from models.user import User
+
+
+class TestFlushErrors(unittest.TestCase):
+    """ Deferred flushes failing to write the journal
+    """
+
+    def setUp(self):
+        """ Deferred journal mode in a new directory whose journal path
+        is a directory: every flush fails until it is removed
+        """
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        self.settings = (User.journal, User.flush_interval,
+                         User.reload_interval, base.FLUSH_RETRY_DELAY)
+        User.journal, User.flush_interval = True, 0.05
+        User.reload_interval, base.FLUSH_RETRY_DELAY = -1, 0.05
+        User.load_from_file()
+        os.mkdir(".db_User.journal")
+
+    def tearDown(self):
+        """ Back to the previous settings and directory
+        """
+        if os.path.isdir(".db_User.journal"):
+            os.rmdir(".db_User.journal")
+        flush_all()
+        (User.journal, User.flush_interval,
+         User.reload_interval, base.FLUSH_RETRY_DELAY) = self.settings
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+        DATA.pop('User', None)
+
+    def wait_for(self, condition, timeout: float = 5):
+        """ Wait until condition() is true
+        """
+        deadline = time.monotonic() + timeout
+        while not condition():
+            if time.monotonic() > deadline:
+                self.fail("timed out")
+            time.sleep(0.01)
+
+    def test_retried_and_surfaced(self):
+        """ A failed flush keeps its batch and reports its error; the
+        flusher goes on and writes the batch once it can
+        """
+        with self.assertLogs('models.base', 'ERROR'):
+            User(email="a@x.io").save()
+            self.wait_for(lambda: User.flush_stats()['error'] is not None)
+        self.assertEqual(User.flush_stats()['pending'], 1)
+        self.assertRaises(OSError, flush_all)
+        User(email="b@x.io").save()
+        self.assertEqual(User.flush_stats()['pending'], 2)
+
+        os.rmdir(".db_User.journal")
+        self.wait_for(lambda: User.flush_stats()['pending'] == 0)
+        self.assertTrue(base._flusher.is_alive())
+        self.assertIsNone(User.flush_stats()['error'])
+        User.load_from_file()
+        self.assertEqual({u.email for u in User.all()}, {"a@x.io", "b@x.io"})
+
+
+if __name__ == "__main__":
+    unittest.main()
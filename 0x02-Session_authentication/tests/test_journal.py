@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+""" Tests of the journal of the JSON storage shared by several processes
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from models.base import DATA
+from models.user import User
+from models.user_session import UserSession
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def start_worker(cwd: str, code: str, journal: str = "1") -> subprocess.Popen:
+    """ Start code in another process on the files of cwd (journal mode
+    unless journal is "0", 2 kB journals)
+    """
+    env = dict(os.environ, PYTHONPATH=ROOT, BASE_STORAGE="json",
+               BASE_JOURNAL=journal, BASE_JOURNAL_MAX_SIZE="2000",
+               BASE_FLUSH_INTERVAL="0")
+    script = ("from models.user import User\n"
+              "from models.user_session import UserSession\n"
+              "User.load_from_file()\nUserSession.load_from_file()\n" + code)
+    return subprocess.Popen([sys.executable, "-c", script], cwd=cwd, env=env,
+                            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                            universal_newlines=True)
+
+
+def run_worker(cwd: str, code: str, journal: str = "1") -> str:
+    """ Run code in another process (see start_worker), return its output
+    """
+    worker = start_worker(cwd, code, journal)
+    output = worker.communicate()[0]
+    if worker.returncode != 0:
+        raise RuntimeError("worker failed")
+    return output
+
+
+def emails(cwd: str) -> set:
+    """ Emails of the users a fresh process loads from the files of cwd
+    """
+    return set(run_worker(
+        cwd, "for u in User.all():\n    print(u.email)\n").split())
+
+
+class TestCompaction(unittest.TestCase):
+    """ Compaction of a journal other processes append to
+    """
+
+    def setUp(self):
+        """ This process is worker A, in journal mode, in a new directory
+        """
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        self.settings = (User.journal, User.journal_max_size,
+                         User.flush_interval, User.reload_interval)
+        User.journal, User.journal_max_size = True, 2000
+        User.flush_interval, User.reload_interval = 0, -1
+        User.load_from_file()
+
+    def tearDown(self):
+        """ Back to the previous settings and directory
+        """
+        (User.journal, User.journal_max_size,
+         User.flush_interval, User.reload_interval) = self.settings
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+        DATA.pop('User', None)
+
+    def compact(self):
+        """ Save users in this process until the journal is compacted
+        """
+        journal = ".db_User.journal"
+        for i in range(100):
+            User(email="a{}@x.io".format(i)).save()
+            if not os.path.exists(journal):
+                return i + 1
+        self.fail("journal never compacted")
+
+    def test_no_record_lost(self):
+        """ Records another process appended before a compaction are in
+        the snapshot replacing the journal
+        """
+        run_worker(self.tmp.name, "User(email='fromB@x.io').save()\n")
+        saved = self.compact()
+        expected = {"fromB@x.io"} | {"a{}@x.io".format(i)
+                                     for i in range(saved)}
+        self.assertEqual(emails(self.tmp.name), expected)
+
+    def test_removal_not_lost(self):
+        """ A removal another process appended is not undone by a
+        compaction
+        """
+        user = User(email="gone@x.io")
+        user.save()
+        run_worker(self.tmp.name, "User.search({'email': 'gone@x.io'})"
+                   "[0].remove()\n")
+        self.compact()
+        self.assertNotIn("gone@x.io", emails(self.tmp.name))
+
+    def test_concurrent_writers(self):
+        """ Processes saving at the same time, each compacting the
+        journal several times, lose none of each other's users
+        """
+        code = ("for i in range(150):\n"
+                "    User(email='{}{{}}@x.io'.format(i)).save()\n")
+        workers = [start_worker(self.tmp.name, code.format(name))
+                   for name in ("b", "c", "d")]
+        for worker in workers:
+            worker.communicate()
+            self.assertEqual(worker.returncode, 0)
+        self.assertEqual(emails(self.tmp.name), {
+            "{}{}@x.io".format(name, i)
+            for name in ("b", "c", "d") for i in range(150)})
+
+
+class TestReload(unittest.TestCase):
+    """ reload_if_changed() of processes sharing a compacted journal
+    """
+
+    def setUp(self):
+        """ This process is worker A, in journal mode, checking for the
+        writes of the others on every read
+        """
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        self.settings = (User.journal, User.journal_max_size,
+                         User.flush_interval, User.reload_interval)
+        User.journal, User.journal_max_size = True, 2000
+        User.flush_interval, User.reload_interval = 0, 0
+        User.load_from_file()
+
+    def tearDown(self):
+        """ Back to the previous settings and directory
+        """
+        (User.journal, User.journal_max_size,
+         User.flush_interval, User.reload_interval) = self.settings
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+        DATA.pop('User', None)
+
+    def test_append_compact_reload(self):
+        """ B appends, A compacts, then both reload: they converge on
+        the users of both
+        """
+        worker_b = start_worker(self.tmp.name, (
+            "User(email='fromB@x.io').save()\n"
+            "print('saved', flush=True)\n"
+            "input()\n"
+            "User.reload_if_changed()\n"
+            "for u in User.all():\n"
+            "    print(u.email)\n"))
+        self.assertEqual(worker_b.stdout.readline(), "saved\n")
+        expected = {"fromB@x.io"}
+        for i in range(100):
+            User(email="a{}@x.io".format(i)).save()
+            expected.add("a{}@x.io".format(i))
+            if not os.path.exists(".db_User.journal"):
+                break
+        else:
+            self.fail("journal never compacted")
+        seen_by_b = set(worker_b.communicate("go\n")[0].split())
+        self.assertEqual(worker_b.returncode, 0)
+        User.reload_if_changed()
+        self.assertEqual({u.email for u in User.all()}, expected)
+        self.assertEqual(seen_by_b, expected)
+        self.assertEqual(emails(self.tmp.name), expected)
+
+
+class TestSessions(unittest.TestCase):
+    """ Sessions created by processes in the default (non-journal) mode
+    """
+
+    def setUp(self):
+        """ This process is worker A, in a new directory
+        """
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        UserSession.load_from_file()
+
+    def tearDown(self):
+        """ Back to the previous directory
+        """
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+        DATA.pop('UserSession', None)
+
+    def test_sessions_not_lost(self):
+        """ A and B both loaded the sessions; A creates one, then B does
+        without reloading: a fresh process finds both
+        """
+        worker_b = start_worker(self.tmp.name, (
+            "print('loaded', flush=True)\n"
+            "input()\n"
+            "UserSession(user_id='b', session_id='s-B').save()\n"
+            "UserSession.flush()\n"), journal="0")
+        self.assertEqual(worker_b.stdout.readline(), "loaded\n")
+        UserSession(user_id='a', session_id='s-A').save()
+        UserSession.flush()
+        worker_b.communicate("go\n")
+        self.assertEqual(worker_b.returncode, 0)
+        sessions = run_worker(
+            self.tmp.name, "for s in UserSession.all():\n"
+            "    print(s.session_id)\n", journal="0")
+        self.assertEqual(set(sessions.split()), {"s-A", "s-B"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+""" Tests of the save/remove listeners of the models
+"""
+import gc
+import os
+import tempfile
+import unittest
+from models.base import DATA, LISTENERS
+from models.user import User
+
+
+class Recorder():
+    """ Object listening to the saves of users
+    """
+
+    def __init__(self):
+        """ Initialize Recorder """
+        self.seen = []
+
+    def record(self, obj: User):
+        """ Listener: remember obj """
+        self.seen.append(obj.email)
+
+
+class TestListeners(unittest.TestCase):
+    """ Base.add_listener()
+    """
+
+    def setUp(self):
+        """ Users saved in a new directory, no listener yet
+        """
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        self.listeners = LISTENERS.pop('User', None)
+        User.load_from_file()
+
+    def tearDown(self):
+        """ Back to the previous listeners and directory
+        """
+        LISTENERS.pop('User', None)
+        if self.listeners is not None:
+            LISTENERS['User'] = self.listeners
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+        DATA.pop('User', None)
+
+    def test_bound_method_released(self):
+        """ A listener method does not keep its object alive, and is
+        dropped once the object is gone
+        """
+        recorder = Recorder()
+        User.add_listener(recorder.record)
+        User(email="a@x.io").save()
+        self.assertEqual(recorder.seen, ["a@x.io"])
+        del recorder
+        gc.collect()
+        User(email="b@x.io").save()
+        self.assertEqual(LISTENERS['User'], [])
+
+    def test_function_kept(self):
+        """ A plain function or lambda listener stays registered
+        """
+        seen = []
+        User.add_listener(lambda obj: seen.append(obj.email))
+        gc.collect()
+        User(email="a@x.io").save()
+        self.assertEqual(seen, ["a@x.io"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+""" Tests of Query: the JSON and SQLite backends return the same results
+"""
+import os
+import random
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from models.base import DATA, JSONStorage
+from models.sqlite_storage import SQLiteStorage
+from models.user import User
+
+
+T0 = datetime(2020, 1, 1)
+
+
+class TestBackendParity(unittest.TestCase):
+    """ Queries run by the JSON and SQLite backends on the same users
+    """
+
+    def setUp(self):
+        """ The same users saved to both backends, in a new directory:
+        emails and names with None, created_at with ties
+        """
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        self.previous = User.storage
+        self.json = JSONStorage()
+        # Small chunks: scans cross many chunk boundaries
+        self.json.scan_chunk = 7
+        self.sqlite = SQLiteStorage("test.sqlite3")
+        User.storage = self.json
+        User.load_from_file()
+        self.sqlite.load(User)
+        rand = random.Random(1)
+        self.users = []
+        for i in range(200):
+            user = User(email=rand.choice([
+                "u{}@a.com".format(i), "u{}@b.org".format(i),
+                "u{}@ab.com".format(i), "u{}@x.a.com".format(i), None]))
+            user.first_name = rand.choice([None, "Ann", "Anna", "Bob"])
+            user.created_at = T0 + timedelta(seconds=rand.randrange(60))
+            user.updated_at = user.created_at
+            self.json.save(user)
+            self.users.append(user)
+        self.sqlite.save_many(self.users)
+
+    def tearDown(self):
+        """ Back to the previous backend and directory
+        """
+        self.sqlite.close()
+        User.storage = self.previous
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+        DATA.pop('User', None)
+
+    def assertSameResults(self, query):
+        """ Both backends return what a filter and sort of every user
+        does: in the same order if the query is ordered, else the same
+        set (a subset of the matches of that size if it is limited)
+        """
+        found = {name: [obj.id for obj in storage.query(User, query)]
+                 for name, storage in (("json", self.json),
+                                       ("sqlite", self.sqlite))}
+        matches = [obj for obj in self.users if query.matches(obj)]
+        if query.order is not None:
+            matches.sort(key=query.sort_key, reverse=query.order[1])
+        stop = None
+        if query.limit_count is not None:
+            stop = query.offset_count + query.limit_count
+        expected = [obj.id for obj in matches[query.offset_count:stop]]
+        for name, ids in found.items():
+            with self.subTest(backend=name):
+                if query.order is not None:
+                    self.assertEqual(ids, expected)
+                elif stop is None and not query.offset_count:
+                    self.assertEqual(sorted(ids), sorted(expected))
+                else:
+                    self.assertEqual(len(set(ids)), len(expected))
+                    self.assertLessEqual(
+                        set(ids), {obj.id for obj in matches})
+
+    def test_none_values(self):
+        """ eq() and in_() with None, order on attributes holding None
+        """
+        for query in (
+                User.query().eq('first_name', None),
+                User.query().eq('email', None),
+                User.query().in_('first_name', ['Ann', None]),
+                User.query().in_('email', [None]),
+                User.query().in_('email', [self.users[0].email,
+                                           self.users[1].email, None]),
+                User.query().in_('first_name', []),
+                User.query().order_by('first_name'),
+                User.query().order_by('first_name', True).limit(30),
+                User.query().order_by('email', True).offset(150),
+                User.query().eq('first_name', None).order_by('email'),
+                User.query().prefix('email', 'u1').order_by('first_name'),
+                User.query().between('first_name', 'Anna'),
+        ):
+            with self.subTest(predicates=query.predicates,
+                              order=query.order):
+                self.assertSameResults(query)
+
+    def test_created_at_ranges(self):
+        """ created_at ranges, both directions, low and/or high set,
+        limit and offset across scan chunks
+        """
+        low, high = T0 + timedelta(seconds=20), T0 + timedelta(seconds=40)
+        ranges = ((low, None), (None, high), (low, high), (high, low),
+                  (T0 + timedelta(seconds=59), None))
+        pages = ((None, 0), (5, 0), (10, 13), (None, 50), (1000, 0))
+        for (start, end), descending, (limit, offset) in (
+                (r, d, p) for r in ranges for d in (False, True)
+                for p in pages):
+            query = (User.query().between('created_at', start, end)
+                     .order_by('created_at', descending).offset(offset))
+            if limit is not None:
+                query.limit(limit)
+            with self.subTest(range=(start, end), descending=descending,
+                              page=(limit, offset)):
+                self.assertSameResults(query)
+
+    def test_index_plans(self):
+        """ Prefix and suffix of the indexed email, id and email lookups
+        """
+        for query in (
+                User.query().suffix('email', '@a.com'),
+                User.query().suffix('email', 'a.com'),
+                User.query().suffix('email', ''),
+                User.query().prefix('email', 'u1'),
+                User.query().prefix('email', ''),
+                User.query().prefix('email', 'zz'),
+                User.query().suffix('email', '.com').order_by('created_at'),
+                User.query().suffix('first_name', 'na'),
+                User.query().eq('id', self.users[3].id),
+                User.query().in_('id', [self.users[3].id, "nope"]),
+                User.query().eq('email', self.users[5].email),
+        ):
+            with self.subTest(predicates=query.predicates):
+                self.assertSameResults(query)
+
+    def test_random_queries(self):
+        """ Random combinations of predicates, order, limit and offset
+        """
+        rand = random.Random(2)
+        emails = [user.email for user in self.users]
+        predicates = [
+            lambda q: q.eq('first_name', rand.choice([None, "Ann", "Bob"])),
+            lambda q: q.eq('email', rand.choice(emails)),
+            lambda q: q.in_('first_name',
+                            rand.sample([None, "Ann", "Anna", "Bob"], 2)),
+            lambda q: q.in_('email', rand.sample(emails, 3)),
+            lambda q: q.prefix('email', rand.choice(["u", "u1", "u2"])),
+            lambda q: q.suffix(rand.choice(['email', 'first_name']),
+                               rand.choice(["a.com", ".org", "n", ""])),
+            lambda q: q.between('created_at', *(
+                rand.choice([None, T0 + timedelta(seconds=s)])
+                for s in sorted(rand.sample(range(60), 2)))),
+        ]
+        for _ in range(300):
+            query = User.query()
+            for predicate in rand.sample(predicates, rand.randrange(3)):
+                predicate(query)
+            order = rand.choice([None, 'created_at', 'email', 'first_name'])
+            if order is not None:
+                query.order_by(order, rand.random() < 0.5)
+            if rand.random() < 0.5:
+                query.limit(rand.randrange(20))
+            if rand.random() < 0.3:
+                query.offset(rand.randrange(100))
+            with self.subTest(predicates=query.predicates,
+                              order=query.order, page=(query.limit_count,
+                                                       query.offset_count)):
+                self.assertSameResults(query)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+""" Tests of the expiring sessions
+"""
+import os
+import unittest
+from unittest import mock
+from api.v1.auth.session_exp_auth import SessionExpAuth
+
+
+class Request():
+    """ Request carrying a session cookie
+    """
+
+    def __init__(self, session_id: str):
+        """ Initialize Request """
+        self.cookies = {"_my_session_id": session_id}
+
+
+class TestSessionExpAuth(unittest.TestCase):
+    """ Sessions destroyed before they expire
+    """
+
+    def setUp(self):
+        """ An auth with one-hour sessions, no session yet
+        """
+        env = {"SESSION_DURATION": "3600", "SESSION_NAME": "_my_session_id"}
+        patcher = mock.patch.dict(os.environ, env)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.auth = SessionExpAuth()
+        self.auth.user_id_by_session_id.clear()
+        del self.auth.expiry_heap[:]
+        SessionExpAuth.stale_count = 0
+
+    def test_evicted_during_destroy(self):
+        """ A session evicted between the check and the removal of
+        destroy_session() is not destroyed again
+        """
+        session_id = self.auth.create_session("u1")
+        check = self.auth.user_id_for_session_id
+
+        def evicting_check(session_id):
+            user_id = check(session_id)
+            del self.auth.user_id_by_session_id[session_id]
+            return user_id
+
+        self.auth.user_id_for_session_id = evicting_check
+        self.assertFalse(self.auth.destroy_session(Request(session_id)))
+
+    def test_destroy(self):
+        """ A destroyed session is gone; destroying it again fails
+        """
+        session_id = self.auth.create_session("u1")
+        self.assertTrue(self.auth.destroy_session(Request(session_id)))
+        self.assertIsNone(self.auth.user_id_for_session_id(session_id))
+        self.assertFalse(self.auth.destroy_session(Request(session_id)))
+
+    def test_heap_bounded_by_live_sessions(self):
+        """ Logins followed by logouts do not grow the expiry heap
+        """
+        kept = [self.auth.create_session("k{}".format(i)) for i in range(10)]
+        for i in range(1000):
+            session_id = self.auth.create_session("u{}".format(i))
+            self.assertTrue(self.auth.destroy_session(Request(session_id)))
+        self.assertLessEqual(len(self.auth.expiry_heap), 2 * len(kept) + 1)
+        self.assertLessEqual(set(kept),
+                             {entry[1] for entry in self.auth.expiry_heap})
+        for session_id in kept:
+            self.assertIsNotNone(self.auth.user_id_for_session_id(session_id))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+""" Tests of the SQLite storage backend
+"""
+import json
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from models.base import DATA, JSONStorage
+from models.sqlite_storage import SQLiteStorage
+from models.user import User
+
+
+class Note(User):
+    """ Model whose objects take attributes outside __slots__
+    """
+
+
+class TestExtraAttributes(unittest.TestCase):
+    """ Attributes outside __slots__ in the SQLite backend
+    """
+
+    def setUp(self):
+        """ Notes stored in a new database, in a new directory
+        """
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        self.storage = SQLiteStorage("test.sqlite3")
+        Note.storage = self.storage
+
+    def tearDown(self):
+        """ Back to the previous directory
+        """
+        self.storage.close()
+        del Note.storage
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def column(self, obj: Note, name: str):
+        """ Stored value of column name for obj
+        """
+        return self.storage.connection().execute(
+            'SELECT "{}" FROM Note WHERE id = ?'.format(name),
+            (obj.id,)).fetchone()[0]
+
+    def test_save(self):
+        """ save() and save_many() add columns for new attributes
+        """
+        note = Note(email="a@x.io")
+        note.color = "red"
+        note.save()
+        self.assertEqual(self.column(note, "color"), "red")
+        other = Note(email="b@x.io")
+        other.size = 3
+        self.storage.save_many([other, Note(email="c@x.io")])
+        self.assertEqual(self.column(other, "size"), 3)
+        self.assertIsNone(self.column(note, "size"))
+        self.assertEqual(Note.count(), 3)
+
+    def test_other_process_columns(self):
+        """ A backend loading the table sees the columns added since
+        """
+        self.storage.load(Note)
+        other = SQLiteStorage("test.sqlite3")
+        other.load(Note)
+        note = Note(email="a@x.io")
+        note.color = "red"
+        note.save()
+        self.assertNotIn("color", other.columns(Note))
+        other.load(Note)
+        self.assertIn("color", other.columns(Note))
+        other.close()
+
+    def test_import_json(self):
+        """ Attributes outside __slots__ of the JSON file are imported
+        """
+        with open(".db_Note.json", "w") as f:
+            json.dump({"n1": {"id": "n1", "email": "j@x.io",
+                              "created_at": "2020-01-01T00:00:00",
+                              "updated_at": "2020-01-01T00:00:00",
+                              "color": "blue"}}, f)
+        self.storage.load(Note)
+        self.assertEqual(self.storage.connection().execute(
+            'SELECT color FROM Note WHERE id = ?', ("n1",)).fetchone(),
+            ("blue",))
+
+
+class TestSearchParity(unittest.TestCase):
+    """ search() of the SQLite backend finds what the JSON one does
+    """
+
+    def setUp(self):
+        """ The same users saved to both backends, in a new directory
+        """
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        self.previous = User.storage
+        self.json = JSONStorage()
+        self.sqlite = SQLiteStorage("test.sqlite3")
+        User.storage = self.json
+        User.load_from_file()
+        self.sqlite.load(User)
+        self.t0 = datetime(2020, 1, 1)
+        self.users = []
+        for i in range(12):
+            user = User(email="u{}@x.io".format(i % 5))
+            user.first_name = (None, "Ann", "Bob")[i % 3]
+            user.created_at = self.t0 + timedelta(seconds=i % 4)
+            self.json.save(user)
+            self.users.append(user)
+        self.sqlite.save_many(self.users)
+
+    def tearDown(self):
+        """ Back to the previous backend and directory
+        """
+        self.sqlite.close()
+        User.storage = self.previous
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+        DATA.pop('User', None)
+
+    def test_search(self):
+        """ Same objects for equality on strings, None and datetimes
+        """
+        searches = [
+            {},
+            {"email": "u1@x.io"},
+            {"first_name": None},
+            {"first_name": "Ann", "email": "u2@x.io"},
+            {"created_at": self.t0 + timedelta(seconds=2)},
+            {"created_at": self.t0, "first_name": "Bob"},
+            {"id": self.users[3].id},
+            {"email": "nobody@x.io"},
+        ]
+        for attributes in searches:
+            with self.subTest(attributes=attributes):
+                expected = {u.id for u in self.json.search(User, attributes)}
+                found = {u.id for u in self.sqlite.search(User, attributes)}
+                self.assertEqual(found, expected)
+                self.assertTrue(expected or attributes["email"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,13 +2,20 @@
 """
 Auth module for handling password hashing.
 """
-import bcrypt
 from db import DB
+from hashing import get_hashing_service
 import uuid
 from user import User
 from sqlalchemy.orm.exc import NoResultFound
 
 
+def _hash_password(password: str) -> bytes:
+    """
+    Hash a password with a salt, on the hashing thread pool.
+    """
+    return get_hashing_service().hash_password(password)
+
+
 class Auth:
     """
     Auth class for password management.
@@ -19,14 +26,6 @@ class Auth:
         """
         self._db = DB()
 
-    def _hash_password(password: str) -> bytes:
-        """
-        Hash a password with a salt.
-        """
-        salt = bcrypt.gensalt()
-        hash_password = bcrypt.hashpw(password.encode('utf-8'), salt)
-        return hash_password
-
     def register_user(self, email: str, password: str) -> User:
         """
         Register a new user with email and password.
@@ -35,7 +34,7 @@ class Auth:
             self._db.find_user_by(email=email)
             raise ValueError(f'User {email} already exists')
         except NoResultFound:
-            hashed_password = self._hash_password(password)
+            hashed_password = _hash_password(password)
             user = self._db.add_user(email, hashed_password.decode('utf-8'))
             return user
 
@@ -45,10 +44,19 @@ class Auth:
         """
         try:
             user = self._db.find_user_by(email=email)
-            return bcrypt.checkpw(password.encode('utf-8'),
-                                  user.hashed_password.encode('utf-8'))
         except NoResultFound:
             return False
+        hashing = get_hashing_service()
+        if not hashing.check_password(password, user.hashed_password):
+            return False
+        # Move the stored hash up to the configured cost while we know
+        # the password
+        if hashing.needs_rehash(user.hashed_password):
+            self._db.update_user(
+                user.id,
+                hashed_password=_hash_password(password).decode('utf-8')
+            )
+        return True
 
     def _generate_uuid(self) -> str:
         """
@@ -107,7 +115,7 @@ class Auth:
         """
         try:
             user = self._db.find_user_by(reset_token=reset_token)
-            hashed_password = self._hash_password(password)
+            hashed_password = _hash_password(password)
             self._db.update_user(
                 user.id,
                 hashed_password=hashed_password,